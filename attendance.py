@@ -0,0 +1,199 @@
+# Attendance import script for MovieClubSched
+# Reads a CSV of date,title,headcount and records the attendance of the matching sessions
+
+import argparse
+import csv
+import logging
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Optional
+
+from clubs import club_database
+from ingest import validate_date
+from schema import open_database, upgrade_schema
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# CSV rows resolved and applied per UPDATE statement
+BATCH_SIZE = 5000
+
+
+def parse_headcount(headcount_str: str) -> Optional[int]:
+    """
+    Parse a headcount.
+
+    Args:
+        headcount_str: Headcount from the CSV
+
+    Returns:
+        Headcount, or None if it is not a non-negative integer
+    """
+    try:
+        headcount = int(headcount_str.strip())
+    except ValueError:
+        return None
+    return headcount if headcount >= 0 else None
+
+
+def apply_batch(cursor, batch: list[tuple]) -> tuple[int, int]:
+    """
+    Apply a batch of attendance rows with a single UPDATE ... FROM.
+
+    The batch is loaded into a temporary table and joined to sessions through
+    the movie title and the session date, using the unique indexes on both.
+
+    Args:
+        cursor: Database cursor
+        batch: List of (line, date, title, headcount) tuples
+
+    Returns:
+        Tuple of (number of sessions updated, number of unmatched rows)
+    """
+    cursor.execute("DELETE FROM attendance_import")
+    cursor.executemany(
+        "INSERT INTO attendance_import (line, date, title, headcount) VALUES (?, ?, ?, ?)",
+        batch
+    )
+
+    cursor.execute("""
+        UPDATE session
+        SET attendance = a.headcount
+        FROM attendance_import a
+        JOIN movies m ON m.title = a.title
+        WHERE session.movie_id = m.id AND session.date = a.date
+    """)
+    updated = cursor.rowcount
+
+    cursor.execute("""
+        SELECT a.line, a.date, a.title
+        FROM attendance_import a
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM movies m
+            JOIN session s ON s.movie_id = m.id
+            WHERE m.title = a.title AND s.date = a.date
+        )
+        ORDER BY a.line
+    """)
+    unmatched = cursor.fetchall()
+    for line, screen_date, title in unmatched:
+        logger.warning(f"Row {line}: No session of '{title}' on {screen_date} - skipping")
+
+    return updated, len(unmatched)
+
+
+def import_attendance(csv_path: str, db_path: str) -> bool:
+    """
+    Main function to import attendance from a CSV file.
+
+    All batches are applied in one transaction, so either the whole file is
+    recorded or, on error, none of it is.
+
+    Args:
+        csv_path: Path to the CSV file (columns: date, title, headcount)
+        db_path: Path to the club database
+
+    Returns:
+        True if the file was imported, False if nothing was recorded
+    """
+    logger.info(f"Starting attendance import from {csv_path}")
+
+    try:
+        conn = open_database(db_path)
+        upgrade_schema(conn)
+    except sqlite3.Error as e:
+        logger.error(f"Error opening database: {e}")
+        return False
+
+    sessions_updated = 0
+    rows_unmatched = 0
+    rows_skipped = 0
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TEMP TABLE attendance_import (
+                line INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                title TEXT NOT NULL,
+                headcount INTEGER NOT NULL
+            )
+        """)
+
+        with open(csv_path, 'r', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+
+            batch = []
+            for row_num, row in enumerate(reader, start=2):  # Start at 2 (header is line 1)
+                screen_date = (row.get('date') or '').strip()
+                title = (row.get('title') or '').strip()
+                headcount = parse_headcount(row.get('headcount') or '')
+
+                if not screen_date or not title or headcount is None:
+                    logger.warning(f"Row {row_num}: Missing or invalid fields - skipping")
+                    rows_skipped += 1
+                    continue
+
+                if not validate_date(screen_date):
+                    logger.warning(f"Row {row_num}: Invalid date format '{screen_date}' - skipping")
+                    rows_skipped += 1
+                    continue
+
+                screen_date = datetime.strptime(screen_date, "%Y-%m-%d").date().isoformat()
+                batch.append((row_num, screen_date, title, headcount))
+
+                if len(batch) >= BATCH_SIZE:
+                    updated, unmatched = apply_batch(cursor, batch)
+                    sessions_updated += updated
+                    rows_unmatched += unmatched
+                    batch = []
+
+            if batch:
+                updated, unmatched = apply_batch(cursor, batch)
+                sessions_updated += updated
+                rows_unmatched += unmatched
+
+        conn.commit()
+
+    except FileNotFoundError:
+        logger.error(f"File not found: {csv_path}")
+        return False
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error importing attendance: {e}")
+        return False
+    finally:
+        conn.close()
+
+    logger.info(
+        f"Attendance import complete: {sessions_updated} sessions updated, "
+        f"{rows_unmatched} rows unmatched, {rows_skipped} rows skipped due to errors"
+    )
+    return True
+
+
+def main():
+    """Entry point for the script."""
+    parser = argparse.ArgumentParser(description="Import session attendance into the MovieClubSched database")
+    parser.add_argument('csv_file', type=str, help='CSV file with date, title and headcount columns')
+    parser.add_argument('--club', type=str, help='Club to update, default: the default club')
+
+    args = parser.parse_args()
+
+    try:
+        db_path = club_database(args.club)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    if not import_attendance(args.csv_file, db_path):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# Club registry for MovieClubSched
+# Each club has its own SQLite database (shard), listed in data/clubs.json
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from typing import Optional
+
+from schema import open_database, upgrade_schema
+
+REGISTRY_PATH = "data/clubs.json"
+
+# Used when there is no registry file: a single club stored in the original database
+DEFAULT_CLUB = "default"
+DEFAULT_DATABASE_PATH = "data/movie_club.db"
+
+
+def load_registry(path: str = REGISTRY_PATH) -> dict:
+    """
+    Load the club registry.
+
+    The registry file looks like:
+        {"default": "north", "clubs": {"north": "data/north.db", "south": "data/south.db"}}
+
+    Args:
+        path: Path to the registry file
+
+    Returns:
+        Dict with "default" (club name) and "clubs" (club name -> database path)
+    """
+    if not os.path.exists(path):
+        return {"default": DEFAULT_CLUB, "clubs": {DEFAULT_CLUB: DEFAULT_DATABASE_PATH}}
+
+    with open(path, "r", encoding="utf-8") as registry_file:
+        return json.load(registry_file)
+
+
+def save_registry(registry: dict, path: str = REGISTRY_PATH) -> None:
+    """
+    Save the club registry.
+
+    Args:
+        registry: Registry as returned by load_registry
+        path: Path to the registry file
+    """
+    with open(path, "w", encoding="utf-8") as registry_file:
+        json.dump(registry, registry_file, indent=2)
+        registry_file.write("\n")
+
+
+def club_database(club: Optional[str] = None) -> str:
+    """
+    Find the database of a club.
+
+    Args:
+        club: Club name, defaults to the registry's default club
+
+    Returns:
+        Path to the club's database
+
+    Raises:
+        ValueError: If the club is not in the registry
+    """
+    registry = load_registry()
+    name = club or registry["default"]
+    if name not in registry["clubs"]:
+        raise ValueError(f"Unknown club '{name}' (known clubs: {', '.join(registry['clubs'])})")
+    return registry["clubs"][name]
+
+
+def select_databases(club: Optional[str] = None, all_clubs: bool = False) -> dict:
+    """
+    Select the databases a command should run against.
+
+    Args:
+        club: Club name, defaults to the registry's default club
+        all_clubs: Select every registered club instead
+
+    Returns:
+        Dict mapping club name to database path, in registry order
+    """
+    if all_clubs:
+        return dict(load_registry()["clubs"])
+    name = club or load_registry()["default"]
+    return {name: club_database(name)}
+
+
+def main():
+    """Entry point for the script."""
+    parser = argparse.ArgumentParser(description="Manage the MovieClubSched club registry")
+
+    subparsers = parser.add_subparsers(dest='command', help='Command to execute')
+
+    # List command
+    subparsers.add_parser('list', help='List registered clubs')
+
+    # Add command
+    add_parser = subparsers.add_parser('add', help='Register a club and its database')
+    add_parser.add_argument('name', type=str, help='Club name')
+    add_parser.add_argument('database', type=str, help='Path to the club database')
+    add_parser.add_argument('--default', action='store_true', help='Make this the default club')
+
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        registry = load_registry()
+        for name, db_path in registry["clubs"].items():
+            marker = " (default)" if name == registry["default"] else ""
+            print(f"{name}: {db_path}{marker}")
+    elif args.command == 'add':
+        # Without a registry file, the implicit default club is not saved: the
+        # first club registered replaces it and becomes the default club
+        if os.path.exists(REGISTRY_PATH):
+            registry = load_registry()
+        else:
+            registry = {"default": args.name, "clubs": {}}
+
+        # Two clubs sharing a database would see, and list, each other's rows
+        for name, db_path in registry["clubs"].items():
+            if name != args.name and os.path.abspath(db_path) == os.path.abspath(args.database):
+                print(f"Error: {args.database} is already the database of club '{name}'")
+                sys.exit(1)
+
+        # Create a new club's database, or bring an existing one up to date
+        try:
+            conn = open_database(args.database, create=True)
+            try:
+                upgrade_schema(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+        registry["clubs"][args.name] = args.database
+        if args.default:
+            registry["default"] = args.name
+        save_registry(registry)
+        print(f"Registered club '{args.name}' at {args.database}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
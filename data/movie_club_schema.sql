@@ -23,13 +23,363 @@ CREATE TABLE IF NOT EXISTS "movies" (
             year INTEGER,
             country TEXT,
             url TEXT
-        );
+        , credits TEXT);
 CREATE TABLE session (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
+            date TEXT NOT NULL CHECK (date IS date(julianday(date))),
             movie_id INTEGER NOT NULL,
             host_id INTEGER,
             attendance INTEGER,
             FOREIGN KEY (movie_id) REFERENCES movies(id),
             FOREIGN KEY (host_id) REFERENCES host(id)
         );
+CREATE INDEX session_date_movie_host ON session (date, movie_id, host_id, attendance);
+CREATE TABLE change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            epoch TEXT NOT NULL,
+            counter INTEGER NOT NULL
+        );
+CREATE TRIGGER movies_insert_counter
+                AFTER INSERT ON movies
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER movies_update_counter
+            AFTER UPDATE ON movies
+            WHEN OLD."id" IS NOT NEW."id" OR OLD."title" IS NOT NEW."title" OR OLD."year" IS NOT NEW."year" OR OLD."country" IS NOT NEW."country" OR OLD."url" IS NOT NEW."url" OR OLD."credits" IS NOT NEW."credits"
+            BEGIN
+                UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+            END;
+CREATE TRIGGER movies_delete_counter
+                AFTER DELETE ON movies
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER directors_insert_counter
+                AFTER INSERT ON directors
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER directors_update_counter
+            AFTER UPDATE ON directors
+            WHEN OLD."id" IS NOT NEW."id" OR OLD."fname" IS NOT NEW."fname" OR OLD."mname" IS NOT NEW."mname" OR OLD."lname" IS NOT NEW."lname"
+            BEGIN
+                UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+            END;
+CREATE TRIGGER directors_delete_counter
+                AFTER DELETE ON directors
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER moviedirector_insert_counter
+                AFTER INSERT ON moviedirector
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER moviedirector_update_counter
+            AFTER UPDATE ON moviedirector
+            WHEN OLD."movie_id" IS NOT NEW."movie_id" OR OLD."director_id" IS NOT NEW."director_id" OR OLD."director_ord" IS NOT NEW."director_ord"
+            BEGIN
+                UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+            END;
+CREATE TRIGGER moviedirector_delete_counter
+                AFTER DELETE ON moviedirector
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER host_insert_counter
+                AFTER INSERT ON host
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER host_update_counter
+            AFTER UPDATE ON host
+            WHEN OLD."id" IS NOT NEW."id" OR OLD."fname" IS NOT NEW."fname" OR OLD."lname" IS NOT NEW."lname"
+            BEGIN
+                UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+            END;
+CREATE TRIGGER host_delete_counter
+                AFTER DELETE ON host
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER session_insert_counter
+                AFTER INSERT ON session
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER session_update_counter
+            AFTER UPDATE ON session
+            WHEN OLD."id" IS NOT NEW."id" OR OLD."date" IS NOT NEW."date" OR OLD."movie_id" IS NOT NEW."movie_id" OR OLD."host_id" IS NOT NEW."host_id" OR OLD."attendance" IS NOT NEW."attendance"
+            BEGIN
+                UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+            END;
+CREATE TRIGGER session_delete_counter
+                AFTER DELETE ON session
+                BEGIN
+                    UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+                END;
+CREATE TRIGGER moviedirector_insert_credits
+        AFTER INSERT ON moviedirector
+        BEGIN
+            UPDATE movies SET credits = 
+    (SELECT GROUP_CONCAT(name, '; ') FROM (
+        SELECT d.fname
+               || CASE WHEN IFNULL(d.mname, '') = '' THEN '' ELSE ' ' || d.mname END
+               || CASE WHEN IFNULL(d.lname, '') = '' THEN '' ELSE ' ' || d.lname END AS name
+        FROM moviedirector md
+        JOIN directors d ON md.director_id = d.id
+        WHERE md.movie_id = movies.id
+        ORDER BY md.director_ord
+    ))
+ WHERE id = NEW.movie_id;
+        END;
+CREATE TRIGGER moviedirector_update_credits
+        AFTER UPDATE ON moviedirector
+        BEGIN
+            UPDATE movies SET credits = 
+    (SELECT GROUP_CONCAT(name, '; ') FROM (
+        SELECT d.fname
+               || CASE WHEN IFNULL(d.mname, '') = '' THEN '' ELSE ' ' || d.mname END
+               || CASE WHEN IFNULL(d.lname, '') = '' THEN '' ELSE ' ' || d.lname END AS name
+        FROM moviedirector md
+        JOIN directors d ON md.director_id = d.id
+        WHERE md.movie_id = movies.id
+        ORDER BY md.director_ord
+    ))
+ WHERE id IN (OLD.movie_id, NEW.movie_id);
+        END;
+CREATE TRIGGER moviedirector_delete_credits
+        AFTER DELETE ON moviedirector
+        BEGIN
+            UPDATE movies SET credits = 
+    (SELECT GROUP_CONCAT(name, '; ') FROM (
+        SELECT d.fname
+               || CASE WHEN IFNULL(d.mname, '') = '' THEN '' ELSE ' ' || d.mname END
+               || CASE WHEN IFNULL(d.lname, '') = '' THEN '' ELSE ' ' || d.lname END AS name
+        FROM moviedirector md
+        JOIN directors d ON md.director_id = d.id
+        WHERE md.movie_id = movies.id
+        ORDER BY md.director_ord
+    ))
+ WHERE id = OLD.movie_id;
+        END;
+CREATE TRIGGER directors_update_credits
+        AFTER UPDATE OF fname, mname, lname ON directors
+        BEGIN
+            UPDATE movies SET credits = 
+    (SELECT GROUP_CONCAT(name, '; ') FROM (
+        SELECT d.fname
+               || CASE WHEN IFNULL(d.mname, '') = '' THEN '' ELSE ' ' || d.mname END
+               || CASE WHEN IFNULL(d.lname, '') = '' THEN '' ELSE ' ' || d.lname END AS name
+        FROM moviedirector md
+        JOIN directors d ON md.director_id = d.id
+        WHERE md.movie_id = movies.id
+        ORDER BY md.director_ord
+    ))
+
+            WHERE id IN (SELECT movie_id FROM moviedirector WHERE director_id = NEW.id);
+        END;
+CREATE TABLE moviefeature (
+            movie_id INTEGER NOT NULL,
+            feature TEXT NOT NULL,
+            weight REAL NOT NULL,
+            PRIMARY KEY (movie_id, feature),
+            FOREIGN KEY (movie_id) REFERENCES movies(id)
+        ) WITHOUT ROWID
+    ;
+CREATE INDEX moviefeature_feature ON moviefeature (feature, movie_id);
+CREATE TRIGGER movies_insert_features AFTER INSERT ON movies BEGIN 
+        DELETE FROM moviefeature WHERE movie_id = NEW.id;
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT id, 'country:' || country, 1.0
+        FROM movies WHERE id = NEW.id AND country IS NOT NULL
+        UNION ALL
+        SELECT id, 'decade:' || (year / 10 * 10), 1.0
+        FROM movies WHERE id = NEW.id AND year IS NOT NULL
+        UNION ALL
+        SELECT movie_id, 'director:' || director_id, 3.0
+        FROM moviedirector WHERE movie_id = NEW.id
+        UNION ALL
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = NEW.id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+     END;
+CREATE TRIGGER movies_update_features AFTER UPDATE OF year, country ON movies BEGIN 
+        DELETE FROM moviefeature WHERE movie_id = NEW.id;
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT id, 'country:' || country, 1.0
+        FROM movies WHERE id = NEW.id AND country IS NOT NULL
+        UNION ALL
+        SELECT id, 'decade:' || (year / 10 * 10), 1.0
+        FROM movies WHERE id = NEW.id AND year IS NOT NULL
+        UNION ALL
+        SELECT movie_id, 'director:' || director_id, 3.0
+        FROM moviedirector WHERE movie_id = NEW.id
+        UNION ALL
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = NEW.id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+     END;
+CREATE TRIGGER movies_delete_features AFTER DELETE ON movies BEGIN DELETE FROM moviefeature WHERE movie_id = OLD.id; END;
+CREATE TRIGGER moviedirector_insert_features AFTER INSERT ON moviedirector BEGIN 
+        DELETE FROM moviefeature WHERE movie_id = NEW.movie_id;
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT id, 'country:' || country, 1.0
+        FROM movies WHERE id = NEW.movie_id AND country IS NOT NULL
+        UNION ALL
+        SELECT id, 'decade:' || (year / 10 * 10), 1.0
+        FROM movies WHERE id = NEW.movie_id AND year IS NOT NULL
+        UNION ALL
+        SELECT movie_id, 'director:' || director_id, 3.0
+        FROM moviedirector WHERE movie_id = NEW.movie_id
+        UNION ALL
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = NEW.movie_id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+     END;
+CREATE TRIGGER moviedirector_update_features AFTER UPDATE ON moviedirector BEGIN 
+        DELETE FROM moviefeature WHERE movie_id = OLD.movie_id;
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT id, 'country:' || country, 1.0
+        FROM movies WHERE id = OLD.movie_id AND country IS NOT NULL
+        UNION ALL
+        SELECT id, 'decade:' || (year / 10 * 10), 1.0
+        FROM movies WHERE id = OLD.movie_id AND year IS NOT NULL
+        UNION ALL
+        SELECT movie_id, 'director:' || director_id, 3.0
+        FROM moviedirector WHERE movie_id = OLD.movie_id
+        UNION ALL
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = OLD.movie_id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+    
+        DELETE FROM moviefeature WHERE movie_id = NEW.movie_id;
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT id, 'country:' || country, 1.0
+        FROM movies WHERE id = NEW.movie_id AND country IS NOT NULL
+        UNION ALL
+        SELECT id, 'decade:' || (year / 10 * 10), 1.0
+        FROM movies WHERE id = NEW.movie_id AND year IS NOT NULL
+        UNION ALL
+        SELECT movie_id, 'director:' || director_id, 3.0
+        FROM moviedirector WHERE movie_id = NEW.movie_id
+        UNION ALL
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = NEW.movie_id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+     END;
+CREATE TRIGGER moviedirector_delete_features AFTER DELETE ON moviedirector BEGIN 
+        DELETE FROM moviefeature WHERE movie_id = OLD.movie_id;
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT id, 'country:' || country, 1.0
+        FROM movies WHERE id = OLD.movie_id AND country IS NOT NULL
+        UNION ALL
+        SELECT id, 'decade:' || (year / 10 * 10), 1.0
+        FROM movies WHERE id = OLD.movie_id AND year IS NOT NULL
+        UNION ALL
+        SELECT movie_id, 'director:' || director_id, 3.0
+        FROM moviedirector WHERE movie_id = OLD.movie_id
+        UNION ALL
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = OLD.movie_id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+     END;
+CREATE TRIGGER session_insert_features AFTER INSERT ON session WHEN NEW.attendance IS NOT NULL BEGIN 
+        DELETE FROM moviefeature
+        WHERE movie_id = NEW.movie_id AND feature >= 'audience:' AND feature < 'audience;';
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = NEW.movie_id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+     END;
+CREATE TRIGGER session_update_features AFTER UPDATE OF movie_id, attendance ON session WHEN OLD.movie_id IS NOT NEW.movie_id OR OLD.attendance IS NOT NEW.attendance BEGIN 
+        DELETE FROM moviefeature
+        WHERE movie_id = OLD.movie_id AND feature >= 'audience:' AND feature < 'audience;';
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = OLD.movie_id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+    
+        DELETE FROM moviefeature
+        WHERE movie_id = NEW.movie_id AND feature >= 'audience:' AND feature < 'audience;';
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = NEW.movie_id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+     END;
+CREATE TRIGGER session_delete_features AFTER DELETE ON session WHEN OLD.attendance IS NOT NULL BEGIN 
+        DELETE FROM moviefeature
+        WHERE movie_id = OLD.movie_id AND feature >= 'audience:' AND feature < 'audience;';
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) 
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, 0.5
+        FROM session WHERE movie_id = OLD.movie_id AND attendance IS NOT NULL
+        GROUP BY movie_id
+    ;
+     END;
+CREATE UNIQUE INDEX movies_title_year ON movies (title, year);
+CREATE UNIQUE INDEX session_date_movie ON session (date, movie_id);
+CREATE INDEX session_movie_attendance ON session (movie_id, attendance);
+-- Row of the change counter, with a new epoch for each database built from this file
+INSERT INTO change_counter (id, epoch, counter) VALUES (1, lower(hex(randomblob(8))), 0);
+-- Upgrade steps of schema.py already included above (schema.SCHEMA_VERSION)
+PRAGMA user_version = 7;
@@ -0,0 +1,228 @@
+# Dump/restore script for MovieClubSched
+# Streams every table to a JSONL file with a manifest, and reloads them into a new database
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import sys
+from datetime import datetime
+
+from schema import open_database, upgrade_schema
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DATABASE_PATH = "data/movie_club.db"
+MANIFEST_NAME = "manifest.json"
+DUMP_FORMAT = 1
+
+# Rows fetched from SQLite, or decoded from a dump file, per batch
+BATCH_SIZE = 10000
+
+# Reused for every row: json.dumps with non-default options builds a new encoder per call
+ROW_ENCODER = json.JSONEncoder(ensure_ascii=False, check_circular=False)
+
+
+def read_rows(infile):
+    """
+    Yield the rows of a JSONL dump file.
+
+    Lines are decoded a batch at a time as one JSON array, which is much
+    faster than one json.loads call per line.
+
+    Args:
+        infile: Open dump file
+
+    Yields:
+        Rows as lists of column values
+    """
+    while batch := list(itertools.islice(infile, BATCH_SIZE)):
+        yield from json.loads("[" + ",".join(batch) + "]")
+
+
+def dump_database(db_path: str, out_dir: str) -> None:
+    """
+    Dump every table to <table>.jsonl in out_dir, plus a manifest.
+
+    Each line is a JSON array of column values, so NULLs and empty strings
+    survive the round trip. All tables are read inside one transaction, so
+    the dump is a consistent snapshot even if ingest.py runs meanwhile.
+
+    Args:
+        db_path: Path to the database to dump
+        out_dir: Directory to write the dump to (created if missing)
+    """
+    logger.info(f"Dumping {db_path} to {out_dir}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    conn = open_database(db_path)
+    upgrade_schema(conn)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("BEGIN")
+        schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        objects = cursor.execute("""
+            SELECT type, name, sql FROM sqlite_master
+            WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+            ORDER BY rowid
+        """).fetchall()
+        sequences = dict(cursor.execute("SELECT name, seq FROM sqlite_sequence").fetchall())
+
+        tables = []
+        for obj_type, name, sql in objects:
+            if obj_type != "table":
+                continue
+
+            file_name = f"{name}.jsonl"
+            cursor.execute(f'SELECT * FROM "{name}"')
+            columns = [col[0] for col in cursor.description]
+            rows = 0
+            with open(os.path.join(out_dir, file_name), "w", encoding="utf-8") as outfile:
+                while batch := cursor.fetchmany(BATCH_SIZE):
+                    outfile.writelines(ROW_ENCODER.encode(row) + "\n" for row in batch)
+                    rows += len(batch)
+
+            tables.append({"name": name, "file": file_name, "columns": columns, "rows": rows, "sql": sql})
+            logger.info(f"Dumped {rows} rows from {name}")
+
+        manifest = {
+            "format": DUMP_FORMAT,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "schema_version": schema_version,
+            "tables": tables,
+            "indexes": [sql for obj_type, name, sql in objects if obj_type == "index"],
+            "triggers": [sql for obj_type, name, sql in objects if obj_type == "trigger"],
+            "views": [sql for obj_type, name, sql in objects if obj_type == "view"],
+            "sequences": sequences,
+        }
+        with open(os.path.join(out_dir, MANIFEST_NAME), "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+    finally:
+        conn.rollback()
+        conn.close()
+
+    logger.info(f"Dump complete: {len(tables)} tables")
+
+
+def restore_database(in_dir: str, db_path: str, force: bool = False) -> None:
+    """
+    Restore a dump written by dump_database into a new database.
+
+    Tables are created bare and loaded with executemany in one transaction,
+    with foreign key enforcement off. Indexes and triggers are created only
+    after the load, so triggers do not fire for restored rows and each index
+    is built once instead of updated per row. Foreign keys are checked at the end.
+
+    Args:
+        in_dir: Directory containing the dump
+        db_path: Path of the database to create
+        force: Overwrite db_path if it already exists
+    """
+    with open(os.path.join(in_dir, MANIFEST_NAME), "r", encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if manifest.get("format") != DUMP_FORMAT:
+        raise ValueError(f"Unsupported dump format: {manifest.get('format')}")
+
+    if os.path.exists(db_path):
+        if not force:
+            raise FileExistsError(f"{db_path} already exists (use --force to overwrite)")
+        os.remove(db_path)
+
+    logger.info(f"Restoring {in_dir} to {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # The new file is discarded on failure, so durability during the load is not needed
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        cursor.execute("PRAGMA journal_mode = OFF")
+        cursor.execute("PRAGMA synchronous = OFF")
+
+        cursor.execute("BEGIN")
+        for table in manifest["tables"]:
+            cursor.execute(table["sql"])
+
+        for table in manifest["tables"]:
+            columns = ", ".join(f'"{col}"' for col in table["columns"])
+            placeholders = ", ".join("?" for _ in table["columns"])
+            with open(os.path.join(in_dir, table["file"]), "r", encoding="utf-8") as infile:
+                cursor.executemany(
+                    f'INSERT INTO "{table["name"]}" ({columns}) VALUES ({placeholders})',
+                    read_rows(infile)
+                )
+            logger.info(f"Restored {table['rows']} rows into {table['name']}")
+
+        for sql in manifest["indexes"] + manifest["views"] + manifest["triggers"]:
+            cursor.execute(sql)
+
+        # Inserting explicit ids moves each sequence to the max id; restore the recorded values
+        cursor.execute("DELETE FROM sqlite_sequence")
+        cursor.executemany(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+            manifest["sequences"].items()
+        )
+
+        # A restored database is a new file: cached query results must not carry over
+        if any(table["name"] == "change_counter" for table in manifest["tables"]):
+            cursor.execute("UPDATE change_counter SET epoch = ? WHERE id = 1", (secrets.token_hex(8),))
+        cursor.execute(f"PRAGMA user_version = {int(manifest['schema_version'])}")
+        conn.commit()
+    except Exception:
+        conn.close()
+        os.remove(db_path)
+        raise
+
+    try:
+        violations = cursor.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            logger.warning(f"Restored database has {len(violations)} foreign key violations")
+        upgrade_schema(conn)
+    finally:
+        conn.close()
+
+    logger.info(f"Restore complete: {len(manifest['tables'])} tables")
+
+
+def main():
+    """Entry point for the script."""
+    parser = argparse.ArgumentParser(description="Dump and restore the MovieClubSched database")
+
+    subparsers = parser.add_subparsers(dest='command', help='Command to execute')
+
+    # Dump command
+    dump_parser = subparsers.add_parser('dump', help='Dump every table to JSONL files with a manifest')
+    dump_parser.add_argument('out_dir', type=str, help='Directory to write the dump to')
+    dump_parser.add_argument('--db', type=str, default=DATABASE_PATH, help='Database to dump')
+
+    # Restore command
+    restore_parser = subparsers.add_parser('restore', help='Restore a dump into a new database')
+    restore_parser.add_argument('in_dir', type=str, help='Directory containing the dump')
+    restore_parser.add_argument('--db', type=str, default=DATABASE_PATH, help='Database to create')
+    restore_parser.add_argument('--force', action='store_true', help='Overwrite the database if it exists')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'dump':
+            dump_database(args.db, args.out_dir)
+        elif args.command == 'restore':
+            restore_database(args.in_dir, args.db, args.force)
+        else:
+            parser.print_help()
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.error(f"{args.command.capitalize()} failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+# Metadata enrichment script for MovieClubSched
+# Fills in years, directors and IMDb links from locally downloaded IMDb dataset files
+# (https://datasets.imdbws.com/). Each file is streamed once and never held in memory.
+
+import argparse
+import gzip
+import logging
+import os
+import re
+import sqlite3
+from typing import Iterator, Optional, Tuple
+
+from clubs import club_database
+from ingest import find_or_insert_director, insert_movie_directors
+from schema import open_database, upgrade_schema
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+IDEAS_PATH = "data/ideas.psv"
+IDEAS_OUTPUT_PATH = "data/ideas_enriched.psv"
+
+TITLE_BASICS = "title.basics.tsv.gz"
+TITLE_CREW = "title.crew.tsv.gz"
+NAME_BASICS = "name.basics.tsv.gz"
+
+# IMDb title types that can be matched by title and year
+MOVIE_TITLE_TYPES = {"movie", "tvMovie", "video"}
+
+# IMDb marks missing values with \N
+IMDB_NULL = "\\N"
+
+TCONST_PATTERN = re.compile(r"tt\d+")
+
+
+def imdb_url(tconst: str) -> str:
+    """Build the IMDb title link for a tconst."""
+    return f"https://www.imdb.com/title/{tconst}/"
+
+
+def extract_tconst(url: Optional[str]) -> Optional[str]:
+    """
+    Extract an IMDb title ID (tconst) from a link.
+
+    Args:
+        url: IMDb title link, e.g. https://www.imdb.com/title/tt0083511/
+
+    Returns:
+        tconst or None if the link has no title ID
+    """
+    if not url:
+        return None
+    match = TCONST_PATTERN.search(url)
+    return match.group(0) if match else None
+
+
+def title_key(title: str, year) -> Tuple[str, str]:
+    """Build the key used to match a movie without a link against IMDb titles."""
+    return (title.strip().casefold(), str(year))
+
+
+def structure_director_name(full_name: str) -> Tuple[str, str, str]:
+    """
+    Split a director's full name from IMDb into first, middle, and last names.
+
+    Unlike ingest.parse_director_name, names of any length are accepted since
+    IMDb names are authoritative: every word between the first and the last
+    becomes part of the middle name.
+
+    Args:
+        full_name: The director's full name
+
+    Returns:
+        Tuple of (fname, mname, lname)
+    """
+    parts = full_name.strip().split()
+
+    if len(parts) == 1:
+        return (parts[0], "", "")
+    return (parts[0], " ".join(parts[1:-1]), parts[-1])
+
+
+def stream_tsv(path: str) -> Iterator[str]:
+    """
+    Yield the data lines of a gzipped IMDb TSV file, skipping the header.
+
+    Args:
+        path: Path to the .tsv.gz file
+
+    Yields:
+        Lines without the trailing newline
+    """
+    with gzip.open(path, "rt", encoding="utf-8", newline="\n") as tsvfile:
+        next(tsvfile, None)
+        for line in tsvfile:
+            yield line.rstrip("\n")
+
+
+def load_ideas(ideas_path: str) -> list[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Read the ideas list of (title, link) pairs.
+
+    Lines without a "|" (section comments, blank lines) are kept as they
+    are, so the enriched copy keeps the layout of the list.
+
+    Args:
+        ideas_path: Path to the pipe-separated ideas file
+
+    Returns:
+        List of (line, title, url) tuples; title and url are None for lines that are not entries
+    """
+    ideas = []
+    with open(ideas_path, "r", encoding="utf-8") as psvfile:
+        for line in psvfile:
+            line = line.rstrip("\n")
+            if "|" not in line:
+                ideas.append((line, None, None))
+                continue
+            title, _, url = line.partition("|")
+            ideas.append((line, title.strip(), url.strip()))
+    return ideas
+
+
+def scan_title_basics(path: str, wanted_ids: set[str], wanted_titles: set) -> Tuple[dict, dict]:
+    """
+    Stream title.basics once, keeping only the titles we need.
+
+    Args:
+        path: Path to title.basics.tsv.gz
+        wanted_ids: tconsts taken from movie and idea links
+        wanted_titles: title_key of every movie without a link
+
+    Returns:
+        Tuple of (titles, title_matches): titles maps tconst to (primary title,
+        start year or None); title_matches maps title_key to the single
+        tconst matching it
+    """
+    titles = {}
+    # title_key -> tconst, or None once a second candidate makes the match ambiguous
+    title_matches = {}
+
+    for line in stream_tsv(path):
+        tconst, _, rest = line.partition("\t")
+        if tconst in wanted_ids:
+            fields = rest.split("\t", 5)
+            titles[tconst] = (fields[1], None if fields[4] == IMDB_NULL else int(fields[4]))
+        elif wanted_titles:
+            fields = rest.split("\t", 5)
+            if fields[0] not in MOVIE_TITLE_TYPES:
+                continue
+            key = title_key(fields[1], fields[4])
+            if key not in wanted_titles:
+                key = title_key(fields[2], fields[4])
+            if key in wanted_titles:
+                title_matches[key] = None if key in title_matches else tconst
+                titles[tconst] = (fields[1], None if fields[4] == IMDB_NULL else int(fields[4]))
+
+    for key, tconst in list(title_matches.items()):
+        if tconst is None:
+            logger.warning(f"Several IMDb titles match '{key[0]}' ({key[1]}) - skipping")
+            del title_matches[key]
+
+    # Drop candidates that were only seen as part of an ambiguous match
+    kept = wanted_ids | set(title_matches.values())
+    titles = {tconst: info for tconst, info in titles.items() if tconst in kept}
+    return titles, title_matches
+
+
+def scan_title_crew(path: str, tconsts: set[str]) -> dict:
+    """
+    Stream title.crew once, keeping the directors of the titles we need.
+
+    Args:
+        path: Path to title.crew.tsv.gz
+        tconsts: Titles to keep
+
+    Returns:
+        Dict mapping tconst to a list of director nconsts in credit order
+    """
+    crew = {}
+    for line in stream_tsv(path):
+        tconst, _, rest = line.partition("\t")
+        if tconst in tconsts:
+            directors = rest.split("\t", 1)[0]
+            if directors != IMDB_NULL:
+                crew[tconst] = directors.split(",")
+    return crew
+
+
+def scan_name_basics(path: str, nconsts: set[str]) -> dict:
+    """
+    Stream name.basics once, keeping the names of the people we need.
+
+    Args:
+        path: Path to name.basics.tsv.gz
+        nconsts: People to keep
+
+    Returns:
+        Dict mapping nconst to primary name
+    """
+    names = {}
+    for line in stream_tsv(path):
+        nconst, _, rest = line.partition("\t")
+        if nconst in nconsts:
+            names[nconst] = rest.split("\t", 1)[0]
+    return names
+
+
+def enrich(imdb_dir: str, ideas_path: str, ideas_output_path: str, db_path: str) -> None:
+    """
+    Main function to enrich the database and the ideas list from IMDb dataset files.
+
+    Only empty fields are filled: existing years and links are never overwritten,
+    and directors are only added to movies that have none.
+
+    Args:
+        imdb_dir: Directory containing the IMDb .tsv.gz files
+        ideas_path: Path to the ideas list
+        ideas_output_path: Path to write the enriched ideas list
+        db_path: Path to the club database to enrich
+    """
+    logger.info(f"Starting enrichment from {imdb_dir}")
+
+    conn = open_database(db_path)
+    upgrade_schema(conn)
+    cursor = conn.cursor()
+
+    try:
+        movies = cursor.execute("""
+            SELECT m.id, m.title, m.year, m.url,
+                   EXISTS (SELECT 1 FROM moviedirector md WHERE md.movie_id = m.id)
+            FROM movies m
+        """).fetchall()
+        ideas = load_ideas(ideas_path) if os.path.exists(ideas_path) else []
+
+        # Hash sets of the only IDs the scans keep
+        wanted_ids = set()
+        wanted_titles = set()
+        for movie_id, title, year, url, has_directors in movies:
+            tconst = extract_tconst(url)
+            if tconst:
+                wanted_ids.add(tconst)
+            elif year is not None:
+                wanted_titles.add(title_key(title, year))
+        for _, _, url in ideas:
+            tconst = extract_tconst(url)
+            if tconst:
+                wanted_ids.add(tconst)
+
+        titles, title_matches = scan_title_basics(
+            os.path.join(imdb_dir, TITLE_BASICS), wanted_ids, wanted_titles
+        )
+        logger.info(f"Matched {len(titles)} IMDb titles")
+
+        crew = scan_title_crew(os.path.join(imdb_dir, TITLE_CREW), set(titles))
+        nconsts = {nconst for directors in crew.values() for nconst in directors}
+        names = scan_name_basics(os.path.join(imdb_dir, NAME_BASICS), nconsts)
+        logger.info(f"Resolved {len(names)} director names")
+
+        movies_updated = 0
+        for movie_id, title, year, url, has_directors in movies:
+            tconst = extract_tconst(url)
+            if tconst is None and year is not None:
+                tconst = title_matches.get(title_key(title, year))
+            if tconst is None or tconst not in titles:
+                continue
+
+            imdb_year = titles[tconst][1]
+            if year is not None and imdb_year is not None and year != imdb_year:
+                logger.warning(f"Movie '{title}': year {year} differs from IMDb year {imdb_year} - keeping {year}")
+
+            cursor.execute(
+                "UPDATE movies SET url = IFNULL(url, ?), year = IFNULL(year, ?) "
+                "WHERE id = ? AND (url IS NULL OR year IS NULL)",
+                (imdb_url(tconst), imdb_year, movie_id)
+            )
+            updated = cursor.rowcount > 0
+
+            director_names = [names[n] for n in crew.get(tconst, []) if n in names]
+            if not has_directors and director_names:
+                director_ids = [
+                    find_or_insert_director(cursor, *structure_director_name(name))
+                    for name in director_names
+                ]
+                insert_movie_directors(cursor, movie_id, director_ids)
+                logger.info(f"Movie '{title}': added director(s) {'; '.join(director_names)}")
+                updated = True
+
+            movies_updated += updated
+
+        conn.commit()
+        logger.info(f"Updated {movies_updated} movies")
+
+        if ideas:
+            with open(ideas_output_path, "w", encoding="utf-8") as psvfile:
+                for line, title, url in ideas:
+                    if title is None:
+                        psvfile.write(f"{line}\n")
+                        continue
+                    tconst = extract_tconst(url)
+                    info = titles.get(tconst)
+                    year = info[1] if info and info[1] is not None else ""
+                    directors = "; ".join(names[n] for n in crew.get(tconst, []) if n in names)
+                    psvfile.write(f"{title} | {url} | {year} | {directors}\n")
+            logger.info(f"Wrote enriched ideas to {ideas_output_path}")
+
+    except FileNotFoundError as e:
+        conn.rollback()
+        logger.error(f"IMDb dataset file not found: {e.filename}")
+        return
+    finally:
+        conn.close()
+
+
+def main():
+    """Entry point for the script."""
+    parser = argparse.ArgumentParser(description="Enrich MovieClubSched data from IMDb dataset files")
+    parser.add_argument('imdb_dir', type=str,
+                        help=f'Directory containing {TITLE_BASICS}, {TITLE_CREW} and {NAME_BASICS}')
+    parser.add_argument('--ideas', type=str, default=IDEAS_PATH, help='Ideas list to enrich')
+    parser.add_argument('--ideas-output', type=str, default=IDEAS_OUTPUT_PATH,
+                        help='Where to write the enriched ideas list')
+    parser.add_argument('--club', type=str, help='Club database to enrich, default: the default club')
+
+    args = parser.parse_args()
+    try:
+        db_path = club_database(args.club)
+    except ValueError as e:
+        logger.error(str(e))
+        return
+
+    try:
+        enrich(args.imdb_dir, args.ideas, args.ideas_output, db_path)
+    except sqlite3.Error as e:
+        logger.error(f"Enrichment failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +0,0 @@
-.headers on
-.mode csv
-.output directors.csv
-SELECT name FROM directors;
-
@@ -1,13 +1,19 @@
 # CSV ingestion script for MovieClubSched
 # Reads CSV files with movie schedule data and populates the database
 
+import argparse
 import csv
 import logging
+import os
+import sqlite3
 import sys
+import time
 from datetime import datetime
-from sqlite3 import connect
 from typing import Optional, Tuple
 
+from clubs import club_database
+from schema import open_database, upgrade_schema
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,6 +21,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Columns every schedule CSV must have ('host' and 'club' are optional)
+REQUIRED_COLUMNS = {"title", "director", "country of origin", "year", "screen date"}
+
+# Watch mode: seconds between polls, and subfolders for processed and failed files
+WATCH_INTERVAL = 2.0
+ARCHIVE_DIR = "archive"
+ERROR_DIR = "error"
+
 # Country normalization mapping
 COUNTRY_MAPPING = {
     "US": "USA",
@@ -24,8 +38,6 @@ COUNTRY_MAPPING = {
     "England": "United Kingdom",
 }
 
-DATABASE_PATH = "data/movie_club.db"
-
 
 def parse_director_name(full_name: str) -> Optional[Tuple[str, str, str]]:
     """
@@ -171,44 +183,28 @@ def find_or_insert_host(cursor, host_name: str) -> Optional[int]:
     return cursor.lastrowid
 
 
-def check_duplicate_movie(cursor, title: str, year: str) -> Optional[int]:
+def upsert_movie(cursor, title: str, year: str, country: str) -> int:
     """
-    Check if a movie already exists in the database.
+    Insert a movie, or find the existing movie with the same title and year.
 
     Args:
         cursor: Database cursor
         title: Movie title
         year: Release year
+        country: Country of origin (ignored if the movie exists)
 
     Returns:
-        Movie ID if found, None otherwise
+        Movie ID
     """
     cursor.execute(
-        "SELECT id FROM movies WHERE title = ? AND year = ?",
-        (title, int(year))
-    )
-    result = cursor.fetchone()
-    return result[0] if result else None
-
-
-def insert_movie(cursor, title: str, year: str, country: str) -> int:
-    """
-    Insert a new movie into the database.
-
-    Args:
-        cursor: Database cursor
-        title: Movie title
-        year: Release year
-        country: Country of origin
-
-    Returns:
-        Movie ID of inserted movie
-    """
-    cursor.execute(
-        "INSERT INTO movies (title, year, country) VALUES (?, ?, ?)",
+        """
+        INSERT INTO movies (title, year, country) VALUES (?, ?, ?)
+        ON CONFLICT (title, year) DO UPDATE SET title = excluded.title
+        RETURNING id
+        """,
         (title, int(year), country)
     )
-    return cursor.lastrowid
+    return cursor.fetchone()[0]
 
 
 def insert_movie_directors(cursor, movie_id: int, director_ids: list[int]) -> None:
@@ -227,9 +223,11 @@ def insert_movie_directors(cursor, movie_id: int, director_ids: list[int]) -> No
         )
 
 
-def insert_session(cursor, movie_id: int, date: str, host_id: Optional[int]) -> int:
+def upsert_session(cursor, movie_id: int, date: str, host_id: Optional[int]) -> int:
     """
-    Insert a new session into the database.
+    Insert a session, or find the existing session of the movie on that date.
+
+    An existing session takes the given host, if one is given.
 
     Args:
         cursor: Database cursor
@@ -241,25 +239,93 @@ def insert_session(cursor, movie_id: int, date: str, host_id: Optional[int]) ->
         Session ID
     """
     cursor.execute(
-        "INSERT INTO session (date, movie_id, host_id) VALUES (?, ?, ?)",
+        """
+        INSERT INTO session (date, movie_id, host_id) VALUES (?, ?, ?)
+        ON CONFLICT (date, movie_id) DO UPDATE SET host_id = IFNULL(excluded.host_id, host_id)
+        RETURNING id
+        """,
         (date, movie_id, host_id)
     )
-    return cursor.lastrowid
+    return cursor.fetchone()[0]
+
+
+def open_shard(shards: dict, db_path: str) -> dict:
+    """
+    Return the state of a club database, opening it and starting a transaction if needed.
+
+    Each file is written in one transaction per club database, started with
+    BEGIN IMMEDIATE so no other writer can interleave. Upserts return the row
+    ID whether the row was inserted or already there. AUTOINCREMENT IDs only
+    grow, so the sequence of each table is recorded when the transaction
+    starts: a returned ID above it that was not inserted earlier in the same
+    transaction belongs to a new row.
 
+    Args:
+        shards: Shard state by database path, kept open across files in watch mode
+        db_path: Path to the club database
 
-def ingest_csv(csv_path: str) -> None:
+    Returns:
+        Dict with the connection, the recorded sequences and the IDs inserted so far
+    """
+    if db_path not in shards:
+        conn = open_database(db_path)
+        try:
+            upgrade_schema(conn)
+        except Exception:
+            conn.close()
+            raise
+        shards[db_path] = {"conn": conn}
+
+    shard = shards[db_path]
+    conn = shard["conn"]
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+        sequences = dict(conn.execute("SELECT name, seq FROM sqlite_sequence").fetchall())
+        shard["sequences"] = {table: sequences.get(table, 0) for table in ("movies", "session")}
+        shard["inserted"] = {"movies": set(), "session": set()}
+    return shard
+
+
+def is_new_row(shard: dict, table: str, row_id: int) -> bool:
+    """Tell whether an upserted row was inserted rather than found (see open_shard)."""
+    return row_id > shard["sequences"][table] and row_id not in shard["inserted"][table]
+
+
+def ingest_csv(csv_path: str, club: Optional[str] = None, shards: Optional[dict] = None) -> bool:
     """
     Main function to ingest CSV file into the database.
 
+    Rows are routed to the database of the club in their optional 'club'
+    column, falling back to the given club. Each row runs in a savepoint, so
+    a failing row is rolled back alone, and the whole file is committed at
+    once. If the file cannot be read, nothing from it is committed.
+
+    Errors of a single row (bad values, constraint violations) only skip
+    that row. Database errors, like another writer holding the lock, roll
+    back the whole file and are raised, since the file itself is fine and
+    can be ingested again later; upserts make a retry safe.
+
     Args:
         csv_path: Path to the CSV file
+        club: Club for rows without a club column, defaults to the default club
+        shards: Open club databases to reuse (see open_shard); when omitted,
+            databases are opened for this file and closed afterwards
+
+    Returns:
+        True if the file was ingested, False if it could not be read
+
+    Raises:
+        sqlite3.Error: If a club database cannot be opened or written
     """
     logger.info(f"Starting ingestion from {csv_path}")
 
-    conn = connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    own_shards = shards is None
+    if own_shards:
+        shards = {}
+    shard_paths = {}   # club name -> database path
 
     rows_processed = 0
+    rows_rescreenings = 0
     rows_skipped = 0
     rows_duplicates = 0
 
@@ -267,97 +333,256 @@ def ingest_csv(csv_path: str) -> None:
         with open(csv_path, 'r', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
 
+            missing_columns = REQUIRED_COLUMNS - set(reader.fieldnames or [])
+            if missing_columns:
+                logger.error(f"Missing columns in {csv_path}: {', '.join(sorted(missing_columns))}")
+                return False
+
             for row_num, row in enumerate(reader, start=2):  # Start at 2 (header is line 1)
-                try:
-                    # Extract and validate fields
-                    title = row.get('title', '').strip()
-                    director_str = row.get('director', '').strip()
-                    country = row.get('country of origin', '').strip()
-                    year = row.get('year', '').strip()
-                    screen_date = row.get('screen date', '').strip()
-                    host_name = row.get('host', '').strip()
-
-                    # Validate required fields
-                    if not title or not director_str or not year or not country or not screen_date:
-                        logger.warning(f"Row {row_num}: Missing required fields - skipping")
-                        rows_skipped += 1
-                        continue
+                # Extract and validate fields
+                title = (row.get('title') or '').strip()
+                director_str = (row.get('director') or '').strip()
+                country = (row.get('country of origin') or '').strip()
+                year = (row.get('year') or '').strip()
+                screen_date = (row.get('screen date') or '').strip()
+                host_name = (row.get('host') or '').strip()
+
+                # Validate required fields
+                if not title or not director_str or not year or not country or not screen_date:
+                    logger.warning(f"Row {row_num}: Missing required fields - skipping")
+                    rows_skipped += 1
+                    continue
 
-                    # Validate date
-                    if not validate_date(screen_date):
-                        logger.warning(f"Row {row_num}: Invalid date format '{screen_date}' - skipping")
-                        rows_skipped += 1
-                        continue
+                # Validate date
+                if not validate_date(screen_date):
+                    logger.warning(f"Row {row_num}: Invalid date format '{screen_date}' - skipping")
+                    rows_skipped += 1
+                    continue
 
-                    # Normalize country
-                    country = normalize_country(country)
+                # Store the date in canonical form (zero-padded YYYY-MM-DD)
+                screen_date = datetime.strptime(screen_date, "%Y-%m-%d").date().isoformat()
 
-                    # Check for duplicate movie
-                    existing_movie_id = check_duplicate_movie(cursor, title, year)
-                    if existing_movie_id:
-                        logger.info(f"Row {row_num}: Movie '{title}' ({year}) already exists - skipping")
-                        rows_duplicates += 1
-                        continue
+                # Normalize country
+                country = normalize_country(country)
 
-                    # Process directors
-                    director_names = split_directors(director_str)
-                    director_ids = []
+                # Parse directors; they are only needed if the movie is new
+                director_names = split_directors(director_str)
+                parsed_directors = [parse_director_name(name) for name in director_names]
 
-                    for director_name in director_names:
-                        parsed = parse_director_name(director_name)
-                        if parsed is None:
-                            logger.warning(f"Row {row_num}: Cannot parse director '{director_name}' - skipping entire row")
-                            rows_skipped += 1
-                            break
+                # Route the row to its club database
+                row_club = (row.get('club') or '').strip() or club
+                if row_club not in shard_paths:
+                    try:
+                        shard_paths[row_club] = club_database(row_club)
+                    except ValueError as e:
+                        logger.warning(f"Row {row_num}: {e} - skipping")
+                        rows_skipped += 1
+                        continue
 
-                        fname, mname, lname = parsed
-                        director_id = find_or_insert_director(cursor, fname, mname, lname)
-                        director_ids.append(director_id)
-                    else:
-                        # Only proceed if all directors were parsed successfully
-                        # Insert movie
-                        movie_id = insert_movie(cursor, title, year, country)
-                        logger.info(f"Row {row_num}: Inserted movie '{title}' ({year})")
+                # Database errors here concern the whole file and are raised
+                shard = open_shard(shards, shard_paths[row_club])
+                cursor = shard["conn"].cursor()
+                cursor.execute("SAVEPOINT row")
 
-                        # Insert movie-director relationships
+                try:
+                    # Insert the movie, or find it if it was screened before
+                    movie_id = upsert_movie(cursor, title, year, country)
+                    new_movie = is_new_row(shard, "movies", movie_id)
+                    if new_movie and None in parsed_directors:
+                        director_name = director_names[parsed_directors.index(None)]
+                        logger.warning(f"Row {row_num}: Cannot parse director '{director_name}' - skipping entire row")
+                        cursor.execute("ROLLBACK TO row")
+                        cursor.execute("RELEASE row")
+                        rows_skipped += 1
+                        continue
+                    if new_movie:
+                        director_ids = [find_or_insert_director(cursor, *parsed) for parsed in parsed_directors]
                         insert_movie_directors(cursor, movie_id, director_ids)
+                        logger.info(f"Row {row_num}: Inserted movie '{title}' ({year})")
 
-                        # Insert host (if provided)
-                        host_id = find_or_insert_host(cursor, host_name)
+                    # Insert host (if provided)
+                    host_id = find_or_insert_host(cursor, host_name)
 
-                        # Insert session
-                        session_id = insert_session(cursor, movie_id, screen_date, host_id)
-                        logger.info(f"Row {row_num}: Inserted session for '{title}' on {screen_date}")
+                    # Insert the session, or find it if it is already scheduled
+                    session_id = upsert_session(cursor, movie_id, screen_date, host_id)
+                    new_session = is_new_row(shard, "session", session_id)
 
-                        # Commit after each successful row
-                        conn.commit()
+                    cursor.execute("RELEASE row")
+                    if new_movie:
+                        shard["inserted"]["movies"].add(movie_id)
+                    if new_session:
+                        shard["inserted"]["session"].add(session_id)
+
+                    if not new_session:
+                        logger.info(f"Row {row_num}: Session for '{title}' on {screen_date} already exists - skipping")
+                        rows_duplicates += 1
+                    elif new_movie:
+                        logger.info(f"Row {row_num}: Inserted session for '{title}' on {screen_date}")
                         rows_processed += 1
+                    else:
+                        logger.info(f"Row {row_num}: Inserted re-screening of '{title}' ({year}) on {screen_date}")
+                        rows_rescreenings += 1
 
-                except Exception as e:
+                except (ValueError, sqlite3.IntegrityError) as e:
                     logger.error(f"Row {row_num}: Error processing row - {e}")
-                    conn.rollback()
+                    cursor.execute("ROLLBACK TO row")
+                    cursor.execute("RELEASE row")
                     rows_skipped += 1
 
+        # Commit the file in one transaction per club database
+        for shard in shards.values():
+            if shard["conn"].in_transaction:
+                shard["conn"].commit()
+
     except FileNotFoundError:
         logger.error(f"File not found: {csv_path}")
-        return
-    except Exception as e:
+        return False
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
         logger.error(f"Error reading CSV file: {e}")
-        return
+        return False
     finally:
-        conn.close()
+        # Anything still uncommitted belongs to a file that was not ingested
+        for shard in shards.values():
+            if shard["conn"].in_transaction:
+                shard["conn"].rollback()
+            if own_shards:
+                shard["conn"].close()
+
+    logger.info(
+        f"Ingestion complete: {rows_processed} rows processed, {rows_rescreenings} re-screenings added, "
+        f"{rows_duplicates} duplicates skipped, {rows_skipped} rows skipped due to errors"
+    )
+    return True
+
+
+def move_to(path: str, dest_dir: str) -> str:
+    """
+    Move a file into a directory, adding a timestamp if the name is taken.
+
+    Args:
+        path: File to move
+        dest_dir: Destination directory
+
+    Returns:
+        New path of the file
+    """
+    name = os.path.basename(path)
+    dest = os.path.join(dest_dir, name)
+    if os.path.exists(dest):
+        stem, ext = os.path.splitext(name)
+        dest = os.path.join(dest_dir, f"{stem}-{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{ext}")
+    os.replace(path, dest)
+    return dest
+
+
+def watch_directory(watch_dir: str, club: Optional[str] = None, interval: float = WATCH_INTERVAL) -> None:
+    """
+    Watch a drop folder and ingest CSV files as they arrive.
+
+    The folder is polled with a single scandir per interval. A file is
+    ingested once its mtime and size have been unchanged for at least one
+    interval, so files still being copied are left alone. Ingested files are moved to
+    archive/ and unreadable ones to error/, so each file is processed once
+    and never scanned again. A file hitting a database error, e.g. while
+    another writer holds the lock, stays in place and is retried on the
+    next poll. Club databases stay open between files.
+
+    Args:
+        watch_dir: Directory to watch
+        club: Club for rows without a club column, defaults to the default club
+        interval: Seconds between polls when no file is ready
+    """
+    archive_dir = os.path.join(watch_dir, ARCHIVE_DIR)
+    error_dir = os.path.join(watch_dir, ERROR_DIR)
+    os.makedirs(archive_dir, exist_ok=True)
+    os.makedirs(error_dir, exist_ok=True)
 
-    logger.info(f"Ingestion complete: {rows_processed} rows processed, {rows_duplicates} duplicates skipped, {rows_skipped} rows skipped due to errors")
+    logger.info(f"Watching {watch_dir} for CSV files")
+
+    shards = {}
+    seen = {}   # file name -> ((mtime_ns, size), time that signature was first seen)
+
+    try:
+        while True:
+            current = {}
+            now = time.monotonic()
+            with os.scandir(watch_dir) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith('.csv'):
+                        try:
+                            if entry.is_file():
+                                stat = entry.stat()
+                                signature = (stat.st_mtime_ns, stat.st_size)
+                                previous = seen.get(entry.name)
+                                since = previous[1] if previous and previous[0] == signature else now
+                                current[entry.name] = (signature, since)
+                        except OSError:
+                            pass   # Removed while scanning
+
+            # Stability is measured in time, not polls: polls right after a burst are close together
+            ready = sorted(name for name, (_, since) in current.items() if now - since >= interval)
+            moved = 0
+            for name in ready:
+                path = os.path.join(watch_dir, name)
+                try:
+                    if ingest_csv(path, club, shards):
+                        dest = move_to(path, archive_dir)
+                    else:
+                        dest = move_to(path, error_dir)
+                except sqlite3.Error as e:
+                    logger.error(f"Database error while ingesting {name}, will retry: {e}")
+                    continue
+                except OSError as e:
+                    logger.error(f"Cannot move {name}: {e}")
+                    continue
+                logger.info(f"Moved {name} to {dest}")
+                del current[name]
+                moved += 1
+
+            seen = current
+
+            # After a burst, poll again at once in case more files arrived meanwhile
+            if not moved:
+                time.sleep(interval)
+
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+    finally:
+        for shard in shards.values():
+            shard["conn"].close()
 
 
 def main():
     """Entry point for the script."""
-    if len(sys.argv) != 2:
-        print("Usage: uv run ingest.py <csv_file>")
+    parser = argparse.ArgumentParser(description="Ingest a movie schedule CSV into the MovieClubSched database")
+    parser.add_argument('csv_file', type=str, nargs='?', help='CSV file to ingest')
+    parser.add_argument('--club', type=str, help="Club for rows without a 'club' column, default: the default club")
+    parser.add_argument('--watch', type=str, metavar='DIR', help='Watch a directory and ingest CSV files dropped into it')
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL,
+                        help=f'Seconds between polls in watch mode, default: {WATCH_INTERVAL}')
+
+    args = parser.parse_args()
+
+    if (args.csv_file is None) == (args.watch is None):
+        parser.error("give either a CSV file or --watch DIR")
+
+    try:
+        club_database(args.club)
+    except ValueError as e:
+        logger.error(str(e))
         sys.exit(1)
 
-    csv_path = sys.argv[1]
-    ingest_csv(csv_path)
+    if args.watch:
+        watch_directory(args.watch, args.club, args.interval)
+        return
+
+    try:
+        ingested = ingest_csv(args.csv_file, args.club)
+    except sqlite3.Error as e:
+        logger.error(f"Database error, nothing from {args.csv_file} was committed: {e}")
+        sys.exit(1)
+    if not ingested:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -2,12 +2,23 @@
 # Provides various queries for searching and analyzing the movie database
 
 import argparse
+import heapq
+import io
 import sqlite3
 import sys
-from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import date, datetime
 import calendar
+from functools import lru_cache
+from typing import Optional
 
-DATABASE_PATH = "data/movie_club.db"
+from clubs import select_databases
+from query_cache import QueryCache, make_key, read_data_version
+from schema import open_database, upgrade_schema
+
+# Maximum number of club databases queried at the same time
+MAX_WORKERS = 8
 
 
 def format_director_name(fname: str, mname: str, lname: str) -> str:
@@ -24,142 +35,236 @@ def format_host_name(fname: str, lname: str) -> str:
     return fname
 
 
-def generate_schedule(month: int = None, year: int = None) -> None:
+@lru_cache(maxsize=None)
+def format_screen_date(screen_date: str) -> str:
+    """Format an ISO screening date for display, e.g. 'Fri, Jan 24, 2025'."""
+    return date.fromisoformat(screen_date).strftime("%a, %b %d, %Y")
+
+
+def format_club(club: str, show_club: bool) -> str:
+    """Format the club label appended to output lines when several clubs are queried."""
+    return f" [{club}]" if show_club else ""
+
+
+def fetch_shard(club: str, db_path: str, fetch, params: tuple) -> list[tuple]:
     """
-    Generate movie schedule for a given month (default: current month).
-    Results ordered by date in ascending order.
+    Run a fetch function against one club database.
 
     Args:
-        month: Month number (1-12), defaults to current month
-        year: Year, defaults to current year
+        club: Club name
+        db_path: Path to the club database
+        fetch: Function taking a cursor and params, returning sorted rows
+        params: Query parameters
+
+    Returns:
+        Rows prefixed with the club name
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    conn = open_database(db_path)
+    try:
+        return [(club, *row) for row in fetch(conn.cursor(), *params)]
+    finally:
+        conn.close()
 
-    # Default to current month if not specified
-    if month is None or year is None:
-        today = date.today()
-        month = today.month
-        year = today.year
 
-    # Get first and last day of the month
-    first_day = date(year, month, 1)
-    last_day_of_month = calendar.monthrange(year, month)[1]
-    last_day = date(year, month, last_day_of_month)
+def query_shards(databases: dict, fetch, params: tuple, key, reverse: bool = False):
+    """
+    Run a query on every club database in parallel and merge the results.
 
-    print(f"\nMovie Schedule for {first_day.strftime('%B %Y')}")
-    print("=" * 80)
+    SQLite releases the GIL while executing a statement, so the shards are
+    queried concurrently from a thread pool. Each shard returns rows already
+    sorted by the query's ORDER BY, so a streaming k-way merge yields the
+    combined order without concatenating and re-sorting.
 
+    Args:
+        databases: Dict mapping club name to database path
+        fetch: Function taking a cursor and params, returning sorted rows
+        params: Query parameters
+        key: Sort key of a club-prefixed row, matching the query's ORDER BY
+        reverse: True if the query sorts in descending order
+
+    Returns:
+        Iterator over club-prefixed rows in merged order
+    """
+    if len(databases) == 1:
+        (club, db_path), = databases.items()
+        return iter(fetch_shard(club, db_path, fetch, params))
+
+    with ThreadPoolExecutor(max_workers=min(len(databases), MAX_WORKERS)) as pool:
+        shard_rows = list(pool.map(
+            lambda shard: fetch_shard(shard[0], shard[1], fetch, params),
+            databases.items()
+        ))
+    return heapq.merge(*shard_rows, key=key, reverse=reverse)
+
+
+def prefix_rows(club: str, rows):
+    """Lazily prefix each row with the club name."""
+    for row in rows:
+        yield (club, *row)
+
+
+def stream_shards(databases: dict, fetch, params: tuple, key, reverse: bool = False):
+    """
+    Stream the rows of a query from every club database in merged order.
+
+    Unlike query_shards, rows are never fetched all at once: each shard's
+    cursor is read lazily by the k-way merge, so memory stays proportional
+    to the number of shards however many rows match.
+
+    Args:
+        databases: Dict mapping club name to database path
+        fetch: Function taking a cursor and params, returning a cursor over sorted rows
+        params: Query parameters
+        key: Sort key of a club-prefixed row, matching the query's ORDER BY
+        reverse: True if the query sorts in descending order
+
+    Yields:
+        Club-prefixed rows in merged order
+    """
+    connections = []
+    try:
+        for club, db_path in databases.items():
+            connections.append((club, open_database(db_path)))
+        shard_rows = [prefix_rows(club, fetch(conn.cursor(), *params)) for club, conn in connections]
+        yield from heapq.merge(*shard_rows, key=key, reverse=reverse)
+    finally:
+        for _, conn in connections:
+            conn.close()
+
+
+def fetch_schedule(cursor, first_day: str, last_day: str) -> list[tuple]:
+    """Fetch the sessions between two dates, ordered by date."""
     cursor.execute("""
         SELECT
             s.date,
             m.title,
             m.year,
             m.country,
-            GROUP_CONCAT(d.fname || ' ' || IFNULL(d.mname || ' ', '') || d.lname, '; ') as directors,
+            m.credits,
             h.fname,
             h.lname,
             s.attendance
         FROM session s
         JOIN movies m ON s.movie_id = m.id
-        LEFT JOIN moviedirector md ON m.id = md.movie_id
-        LEFT JOIN directors d ON md.director_id = d.id
         LEFT JOIN host h ON s.host_id = h.id
         WHERE s.date >= ? AND s.date <= ?
-        GROUP BY s.id
-        ORDER BY s.date ASC
-    """, (str(first_day), str(last_day)))
-
-    rows = cursor.fetchall()
-
-    if not rows:
-        print(f"No sessions scheduled for {first_day.strftime('%B %Y')}")
-    else:
-        for row in rows:
-            screen_date, title, year, country, directors, host_fname, host_lname = row[:7]
+        ORDER BY s.date ASC, s.movie_id
+    """, (first_day, last_day))
+    return cursor.fetchall()
 
-            print(f"{title}, {directors}, {country}, {year}, {screen_date}")
 
-    conn.close()
-
-
-def search_movie(title: str) -> None:
+def generate_schedule(month: int = None, year: int = None, databases: Optional[dict] = None) -> None:
     """
-    Search for a movie by title and show when it was screened.
+    Generate movie schedule for a given month (default: current month).
+    Results ordered by date in ascending order.
 
     Args:
-        title: Movie title to search for (partial match supported)
+        month: Month number (1-12), defaults to current month
+        year: Year, defaults to current year
+        databases: Club databases to query, defaults to the default club
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    databases = databases or select_databases()
+    show_club = len(databases) > 1
 
-    print(f"\nSearching for movies matching: '{title}'")
+    # Default to current month if not specified
+    if month is None or year is None:
+        today = date.today()
+        month = today.month
+        year = today.year
+
+    # Get first and last day of the month
+    first_day = date(year, month, 1)
+    last_day_of_month = calendar.monthrange(year, month)[1]
+    last_day = date(year, month, last_day_of_month)
+
+    print(f"\nMovie Schedule for {first_day.strftime('%B %Y')}")
     print("=" * 80)
 
+    rows = query_shards(
+        databases, fetch_schedule, (str(first_day), str(last_day)),
+        key=lambda row: row[1]
+    )
+
+    found = False
+    for row in rows:
+        found = True
+        club, screen_date, title, year, country, directors, host_fname, host_lname = row[:8]
+
+        print(f"{title}, {directors}, {country}, {year}, {screen_date}{format_club(club, show_club)}")
+
+    if not found:
+        print(f"No sessions scheduled for {first_day.strftime('%B %Y')}")
+
+
+def fetch_movie_screenings(cursor, title: str) -> list[tuple]:
+    """Fetch movies matching a title with their sessions, ordered by title and date."""
     cursor.execute("""
         SELECT
             m.title,
             m.year,
             m.country,
-            GROUP_CONCAT(d.fname || ' ' || IFNULL(d.mname || ' ', '') || d.lname, '; ') as directors,
+            m.credits,
             s.date,
             h.fname,
             h.lname,
             s.attendance
         FROM movies m
-        LEFT JOIN moviedirector md ON m.id = md.movie_id
-        LEFT JOIN directors d ON md.director_id = d.id
         LEFT JOIN session s ON m.id = s.movie_id
         LEFT JOIN host h ON s.host_id = h.id
         WHERE m.title LIKE ?
-        GROUP BY m.id, s.id
         ORDER BY m.title, s.date
     """, (f"%{title}%",))
+    return cursor.fetchall()
 
-    rows = cursor.fetchall()
 
-    if not rows:
-        print(f"No movies found matching '{title}'")
-    else:
-        current_movie = None
-        for row in rows:
-            movie_title, year, country, directors, screen_date, host_fname, host_lname, attendance = row
+def search_movie(title: str, databases: Optional[dict] = None) -> None:
+    """
+    Search for a movie by title and show when it was screened.
 
-            if current_movie != movie_title:
-                current_movie = movie_title
-                print(f"\n{movie_title} ({year})")
-                print(f"  Director(s): {directors}")
-                print(f"  Country: {country}")
+    Args:
+        title: Movie title to search for (partial match supported)
+        databases: Club databases to query, defaults to the default club
+    """
+    databases = databases or select_databases()
+    show_club = len(databases) > 1
 
-                if screen_date:
-                    print(f"  Screenings:")
+    print(f"\nSearching for movies matching: '{title}'")
+    print("=" * 80)
 
-            if screen_date:
-                date_obj = datetime.strptime(screen_date, "%Y-%m-%d")
-                formatted_date = date_obj.strftime("%a, %b %d, %Y")
-                host = format_host_name(host_fname, host_lname) if host_fname else "TBD"
-                attendance_str = f", Attendance: {attendance}" if attendance else ""
-                print(f"    - {formatted_date}, Host: {host}{attendance_str}")
-            else:
-                if current_movie == movie_title:
-                    print(f"  Not yet screened")
+    # Merge by title, then club, so each club's screenings of a title stay together;
+    # SQLite sorts NULL (never screened) before any date
+    rows = query_shards(
+        databases, fetch_movie_screenings, (title,),
+        key=lambda row: (row[1], row[0], row[5] or "")
+    )
 
-    conn.close()
+    current_movie = None
+    for row in rows:
+        club, movie_title, year, country, directors, screen_date, host_fname, host_lname, attendance = row
 
+        if current_movie != (club, movie_title):
+            current_movie = (club, movie_title)
+            print(f"\n{movie_title} ({year}){format_club(club, show_club)}")
+            print(f"  Director(s): {directors}")
+            print(f"  Country: {country}")
 
-def list_movies_by_director(director_name: str) -> None:
-    """
-    List all movies by a given director.
+            if screen_date:
+                print(f"  Screenings:")
 
-    Args:
-        director_name: Director name to search for (partial match on any part of name)
-    """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+        if screen_date:
+            formatted_date = format_screen_date(screen_date)
+            host = format_host_name(host_fname, host_lname) if host_fname else "TBD"
+            attendance_str = f", Attendance: {attendance}" if attendance else ""
+            print(f"    - {formatted_date}, Host: {host}{attendance_str}")
+        else:
+            print(f"  Not yet screened")
+
+    if current_movie is None:
+        print(f"No movies found matching '{title}'")
 
-    print(f"\nMovies directed by '{director_name}'")
-    print("=" * 80)
 
+def fetch_movies_by_director(cursor, director_name: str) -> list[tuple]:
+    """Fetch movies by a director, newest first."""
     cursor.execute("""
         SELECT
             m.title,
@@ -175,78 +280,350 @@ def list_movies_by_director(director_name: str) -> None:
         GROUP BY m.id
         ORDER BY m.year DESC, m.title
     """, (f"%{director_name}%", f"%{director_name}%", f"%{director_name}%"))
+    return cursor.fetchall()
+
+
+def list_movies_by_director(director_name: str, databases: Optional[dict] = None) -> None:
+    """
+    List all movies by a given director.
+
+    Args:
+        director_name: Director name to search for (partial match on any part of name)
+        databases: Club databases to query, defaults to the default club
+    """
+    databases = databases or select_databases()
+    show_club = len(databases) > 1
+
+    print(f"\nMovies directed by '{director_name}'")
+    print("=" * 80)
+
+    # Newest first, with unknown years last as SQLite sorts NULL last in DESC order
+    rows = query_shards(
+        databases, fetch_movies_by_director, (director_name,),
+        key=lambda row: (row[2] is None, -(row[2] or 0), row[1])
+    )
 
-    rows = cursor.fetchall()
+    found = False
+    for row in rows:
+        found = True
+        club, title, year, country, fname, mname, lname = row
+        director = format_director_name(fname, mname, lname)
+        print(f"  {title} ({year}) - {director} - {country}{format_club(club, show_club)}")
 
-    if not rows:
+    if not found:
         print(f"No movies found for director '{director_name}'")
-    else:
-        for row in rows:
-            title, year, country, fname, mname, lname = row
-            director = format_director_name(fname, mname, lname)
-            print(f"  {title} ({year}) - {director} - {country}")
 
-    conn.close()
+
+def fetch_movies_by_date_range(cursor, start_date: str, end_date: str) -> list[tuple]:
+    """Fetch the sessions between two dates, most recent first."""
+    cursor.execute("""
+        SELECT
+            s.date,
+            m.title,
+            m.year,
+            m.country,
+            m.credits,
+            h.fname,
+            h.lname,
+            s.attendance
+        FROM session s
+        JOIN movies m ON s.movie_id = m.id
+        LEFT JOIN host h ON s.host_id = h.id
+        WHERE s.date >= ? AND s.date <= ?
+        ORDER BY s.date DESC, s.movie_id DESC
+    """, (start_date, end_date))
+    return cursor.fetchall()
 
 
-def list_movies_by_date_range(start_date: str, end_date: str) -> None:
+def list_movies_by_date_range(start_date: str, end_date: str, databases: Optional[dict] = None) -> None:
     """
     List all movies screened in a date range.
 
     Args:
         start_date: Start date (YYYY-MM-DD)
         end_date: End date (YYYY-MM-DD)
+        databases: Club databases to query, defaults to the default club
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    databases = databases or select_databases()
+    show_club = len(databases) > 1
 
     print(f"\nMovies screened between {start_date} and {end_date}")
     print("=" * 80)
 
+    rows = query_shards(
+        databases, fetch_movies_by_date_range, (start_date, end_date),
+        key=lambda row: row[1], reverse=True
+    )
+
+    found = False
+    for row in rows:
+        found = True
+        club, screen_date, title, year, country, directors, host_fname, host_lname, attendance = row
+
+        formatted_date = format_screen_date(screen_date)
+        host = format_host_name(host_fname, host_lname) if host_fname else "TBD"
+        attendance_str = f", Attendance: {attendance}" if attendance else ""
+
+        print(f"\n{formatted_date}{format_club(club, show_club)}")
+        print(f"  {title} ({year}) - {country}")
+        print(f"  Director(s): {directors}")
+        print(f"  Host: {host}{attendance_str}")
+
+    if not found:
+        print(f"No movies screened between {start_date} and {end_date}")
+
+
+def fetch_similar_movies(cursor, title: str, limit: int) -> list[tuple]:
+    """
+    Fetch the movies most similar to the movie matching a title, best first.
+
+    Similarity sums the weights of the features two movies share (directors,
+    country, release decade and audience size), each divided by the number of
+    movies having that feature, so rare shared features count more.
+    """
+    cursor.execute("""
+        SELECT id, title, year
+        FROM movies
+        WHERE title LIKE ?
+        ORDER BY title = ? COLLATE NOCASE DESC, title, year
+        LIMIT 1
+    """, (f"%{title}%", title))
+    movie = cursor.fetchone()
+
+    if movie is None:
+        return []
+
+    movie_id, movie_title, movie_year = movie
     cursor.execute("""
+        WITH counts AS (
+            SELECT f.feature, COUNT(*) AS movies
+            FROM moviefeature q
+            JOIN moviefeature f ON f.feature = q.feature
+            WHERE q.movie_id = ?
+            GROUP BY f.feature
+        )
+        SELECT
+            SUM(f.weight / c.movies) AS score,
+            m.title,
+            m.year,
+            m.country,
+            m.credits,
+            GROUP_CONCAT(substr(f.feature, 1, instr(f.feature, ':') - 1), ', ') AS shared,
+            ? AS similar_to
+        FROM counts c
+        JOIN moviefeature f ON f.feature = c.feature
+        JOIN movies m ON f.movie_id = m.id
+        WHERE f.movie_id != ?
+        GROUP BY f.movie_id
+        ORDER BY score DESC, m.title
+        LIMIT ?
+    """, (movie_id, f"{movie_title} ({movie_year})", movie_id, limit))
+    return cursor.fetchall()
+
+
+def list_similar_movies(title: str, limit: int = 10, databases: Optional[dict] = None) -> None:
+    """
+    List the movies most similar to a given one.
+
+    With several clubs, each club ranks its own movies against its own copy
+    of the movie, and the best matches across clubs are listed.
+
+    Args:
+        title: Movie title (exact match preferred, otherwise partial match)
+        limit: Maximum number of movies to list
+        databases: Club databases to query, defaults to the default club
+    """
+    databases = databases or select_databases()
+    show_club = len(databases) > 1
+
+    rows = query_shards(
+        databases, fetch_similar_movies, (title, limit),
+        key=lambda row: (-row[1], row[2])
+    )
+
+    found = False
+    for row in rows:
+        club, score, similar_title, year, country, directors, shared, similar_to = row
+        if not found:
+            found = True
+            print(f"\nMovies similar to {similar_to}")
+            print("=" * 80)
+        print(f"  {similar_title} ({year}) - {directors} - {country} [shared: {shared}]{format_club(club, show_club)}")
+
+        limit -= 1
+        if limit == 0:
+            break
+
+    if not found:
+        print(f"No similar movies found for '{title}'")
+
+
+# WHERE clause of each find filter, in the order they are combined. Named
+# parameters let a filter use its value several times.
+FIND_FILTERS = {
+    "title": "m.title LIKE :title",
+    "director": """EXISTS (
+            SELECT 1
+            FROM moviedirector md
+            JOIN directors d ON md.director_id = d.id
+            WHERE md.movie_id = m.id
+              AND (d.fname LIKE :director OR d.mname LIKE :director OR d.lname LIKE :director)
+        )""",
+    "country": "m.country = :country COLLATE NOCASE",
+    "year_from": "m.year >= :year_from",
+    "year_to": "m.year <= :year_to",
+    "date_from": "s.date >= :date_from",
+    "date_to": "s.date <= :date_to",
+    "host": "(h.fname LIKE :host OR h.lname LIKE :host)",
+    "min_attendance": "s.attendance >= :min_attendance",
+    "max_attendance": "s.attendance <= :max_attendance",
+}
+
+# Filters matched anywhere in the text rather than exactly
+FIND_PARTIAL_FILTERS = ("title", "director", "host")
+
+
+@lru_cache(maxsize=None)
+def compile_find(shape: tuple[str, ...]) -> str:
+    """
+    Compile the find query for a set of active filters.
+
+    The statement only depends on which filters are set, not on their values,
+    so it is built once per shape and its values are bound as parameters.
+    That also lets sqlite3's statement cache reuse the prepared statement.
+    Sessions are read in date order through the session_date_movie_host
+    index, which also bounds date range filters. A session is unique per
+    date and movie, so ordering by both needs no sort step and rows can be
+    streamed as soon as they match.
+
+    Args:
+        shape: Names of the active filters, in FIND_FILTERS order
+
+    Returns:
+        SQL statement taking the filter values as named parameters
+    """
+    where = "\n          AND ".join(FIND_FILTERS[name] for name in shape) or "1"
+    return f"""
         SELECT
             s.date,
             m.title,
             m.year,
             m.country,
-            GROUP_CONCAT(d.fname || ' ' || IFNULL(d.mname || ' ', '') || d.lname, '; ') as directors,
+            m.credits,
             h.fname,
             h.lname,
             s.attendance
         FROM session s
         JOIN movies m ON s.movie_id = m.id
-        LEFT JOIN moviedirector md ON m.id = md.movie_id
-        LEFT JOIN directors d ON md.director_id = d.id
         LEFT JOIN host h ON s.host_id = h.id
-        WHERE s.date >= ? AND s.date <= ?
-        GROUP BY s.id
-        ORDER BY s.date DESC
-    """, (start_date, end_date))
+        WHERE {where}
+        ORDER BY s.date ASC, s.movie_id
+    """
 
-    rows = cursor.fetchall()
 
-    if not rows:
-        print(f"No movies screened between {start_date} and {end_date}")
-    else:
-        for row in rows:
-            screen_date, title, year, country, directors, host_fname, host_lname, attendance = row
+def fetch_find(cursor, filters: dict) -> sqlite3.Cursor:
+    """Fetch the sessions matching every set filter, ordered by date, as a lazy cursor."""
+    shape = tuple(name for name in FIND_FILTERS if filters.get(name) is not None)
+    values = {
+        name: f"%{filters[name]}%" if name in FIND_PARTIAL_FILTERS else filters[name]
+        for name in shape
+    }
+    return cursor.execute(compile_find(shape), values)
 
-            date_obj = datetime.strptime(screen_date, "%Y-%m-%d")
-            formatted_date = date_obj.strftime("%a, %b %d, %Y")
-            host = format_host_name(host_fname, host_lname) if host_fname else "TBD"
-            attendance_str = f", Attendance: {attendance}" if attendance else ""
 
-            print(f"\n{formatted_date}")
-            print(f"  {title} ({year}) - {country}")
-            print(f"  Director(s): {directors}")
-            print(f"  Host: {host}{attendance_str}")
+def find_sessions(filters: dict, databases: Optional[dict] = None) -> None:
+    """
+    List the sessions matching a combination of filters.
+
+    Args:
+        filters: Filter values by FIND_FILTERS name; None leaves a filter unset
+        databases: Club databases to query, defaults to the default club
+    """
+    databases = databases or select_databases()
+    show_club = len(databases) > 1
+
+    description = ", ".join(f"{name}={value}" for name, value in filters.items() if value is not None)
+    print(f"\nSessions matching: {description or 'all sessions'}")
+    print("=" * 80)
+
+    rows = stream_shards(databases, fetch_find, (filters,), key=lambda row: row[1])
+
+    found = False
+    for row in rows:
+        found = True
+        club, screen_date, title, year, country, directors, host_fname, host_lname, attendance = row
+
+        formatted_date = format_screen_date(screen_date)
+        host = format_host_name(host_fname, host_lname) if host_fname else "TBD"
+        attendance_str = f", Attendance: {attendance}" if attendance else ""
+
+        print(f"  {formatted_date} - {title} ({year}) - {directors} - {country} - Host: {host}{attendance_str}"
+              f"{format_club(club, show_club)}")
+
+    if not found:
+        print("No sessions found")
 
-    conn.close()
+
+def iso_date(value: str) -> str:
+    """Parse a YYYY-MM-DD command line date into the canonical form stored in the database."""
+    try:
+        return datetime.strptime(value.strip(), "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}' (expected YYYY-MM-DD)")
+
+
+def run_cached(command: str, params: dict, run, databases: dict, use_cache: bool = True) -> None:
+    """
+    Run a query, serving its output from the result cache when the databases are unchanged.
+
+    Args:
+        command: Subcommand name
+        params: Resolved subcommand arguments
+        run: Callable that prints the query output
+        databases: Club databases the query reads
+        use_cache: Set to False to always query the databases
+    """
+    # Read the versions before querying, so output is never stored under a newer version
+    versions = []
+    for db_path in databases.values():
+        conn = open_database(db_path)
+        try:
+            upgrade_schema(conn)
+            if use_cache:
+                versions.append(read_data_version(conn))
+        finally:
+            conn.close()
+
+    if not use_cache or None in versions:
+        run()
+        return
+
+    # Counters only grow while an epoch lasts, so the sum changes whenever any shard does
+    version = ("|".join(epoch for epoch, _ in versions), sum(counter for _, counter in versions))
+    cache_db = "|".join(databases.values())
+
+    cache = QueryCache()
+    try:
+        key = make_key(command, params)
+        output = cache.get(cache_db, key, version)
+        if output is None:
+            buffer = io.StringIO()
+            with redirect_stdout(buffer):
+                run()
+            output = buffer.getvalue()
+            cache.put(cache_db, key, version, output)
+        sys.stdout.write(output)
+    finally:
+        cache.close()
 
 
 def main():
     """Entry point for the script."""
     parser = argparse.ArgumentParser(description="Query MovieClubSched database")
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the query result cache')
+    club_group = parser.add_mutually_exclusive_group()
+    club_group.add_argument('--club', type=str, help='Club to query, default: the default club')
+    club_group.add_argument('--all-clubs', action='store_true', help='Query every registered club')
 
     subparsers = parser.add_subparsers(dest='command', help='Command to execute')
 
@@ -265,21 +642,65 @@ def main():
 
     # Date range command
     daterange_parser = subparsers.add_parser('daterange', help='List movies in a date range')
-    daterange_parser.add_argument('start', type=str, help='Start date (YYYY-MM-DD)')
-    daterange_parser.add_argument('end', type=str, help='End date (YYYY-MM-DD)')
+    daterange_parser.add_argument('start', type=iso_date, help='Start date (YYYY-MM-DD)')
+    daterange_parser.add_argument('end', type=iso_date, help='End date (YYYY-MM-DD)')
+
+    # Similar command
+    similar_parser = subparsers.add_parser('similar', help='List movies similar to a given movie')
+    similar_parser.add_argument('title', type=str, help='Movie title to find similar movies for')
+    similar_parser.add_argument('--limit', type=int, default=10, help='Number of movies to list, default: 10')
+
+    # Find command
+    find_parser = subparsers.add_parser('find', help='Find sessions matching any combination of filters')
+    find_parser.add_argument('--title', type=str, help='Movie title (partial match)')
+    find_parser.add_argument('--director', type=str, help='Director name (partial match on any part of name)')
+    find_parser.add_argument('--country', type=str, help='Country of origin (exact match, any case)')
+    find_parser.add_argument('--year-from', type=int, help='Earliest release year')
+    find_parser.add_argument('--year-to', type=int, help='Latest release year')
+    find_parser.add_argument('--from', dest='date_from', type=iso_date, help='Earliest screening date (YYYY-MM-DD)')
+    find_parser.add_argument('--to', dest='date_to', type=iso_date, help='Latest screening date (YYYY-MM-DD)')
+    find_parser.add_argument('--host', type=str, help='Host name (partial match on first or last name)')
+    find_parser.add_argument('--min-attendance', type=int, help='Minimum attendance')
+    find_parser.add_argument('--max-attendance', type=int, help='Maximum attendance')
 
     args = parser.parse_args()
 
+    try:
+        databases = select_databases(args.club, args.all_clubs)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # Resolve the default month here so cached schedules are keyed by the actual month
+    if args.command == 'schedule' and (args.month is None or args.year is None):
+        today = date.today()
+        args.month, args.year = today.month, today.year
+
     if args.command == 'schedule':
-        generate_schedule(args.month, args.year)
+        run = lambda: generate_schedule(args.month, args.year, databases)
     elif args.command == 'search':
-        search_movie(args.title)
+        run = lambda: search_movie(args.title, databases)
     elif args.command == 'director':
-        list_movies_by_director(args.name)
+        run = lambda: list_movies_by_director(args.name, databases)
     elif args.command == 'daterange':
-        list_movies_by_date_range(args.start, args.end)
+        run = lambda: list_movies_by_date_range(args.start, args.end, databases)
+    elif args.command == 'similar':
+        run = lambda: list_similar_movies(args.title, args.limit, databases)
+    elif args.command == 'find':
+        filters = {name: getattr(args, name) for name in FIND_FILTERS}
+        run = lambda: find_sessions(filters, databases)
     else:
         parser.print_help()
+        return
+
+    params = {k: v for k, v in vars(args).items() if k not in ('command', 'no_cache', 'club', 'all_clubs')}
+    # find streams its rows straight to stdout; caching would buffer the whole result first
+    use_cache = not args.no_cache and args.command != 'find'
+    try:
+        run_cached(args.command, params, run, databases, use_cache=use_cache)
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
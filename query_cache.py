@@ -0,0 +1,165 @@
+# On-disk result cache for query.py
+# Stores rendered query output keyed by subcommand and arguments
+
+import json
+import os
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+CACHE_PATH = "data/query_cache.db"
+
+# Total size of cached output kept on disk before least recently used entries are evicted
+CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+# Seconds between last_used updates of an entry; hits within this window do not write
+TOUCH_INTERVAL = 60
+
+# Seconds a write waits for the cache lock held by a concurrent query
+CACHE_TIMEOUT = 5
+
+
+def make_key(command: str, args: dict) -> str:
+    """
+    Build a cache key from a subcommand and its arguments.
+
+    Args:
+        command: Subcommand name
+        args: Resolved subcommand arguments
+
+    Returns:
+        Stable string key
+    """
+    return json.dumps([command, args], sort_keys=True)
+
+
+def read_data_version(conn) -> Optional[Tuple[str, int]]:
+    """
+    Read the change counter of a movie database.
+
+    Args:
+        conn: Connection to the movie database
+
+    Returns:
+        Tuple of (epoch, counter), or None if the database has no change counter
+    """
+    try:
+        row = conn.execute("SELECT epoch, counter FROM change_counter WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return (row[0], row[1]) if row else None
+
+
+class QueryCache:
+    """LRU cache of query output, invalidated by the database change counter."""
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, timeout=CACHE_TIMEOUT)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                db_path TEXT NOT NULL,
+                key TEXT NOT NULL,
+                epoch TEXT NOT NULL,
+                counter INTEGER NOT NULL,
+                output TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (db_path, key)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.conn.commit()
+
+    def get(self, db_path: str, key: str, version: Tuple[str, int]) -> Optional[str]:
+        """
+        Look up cached output, ignoring entries from an older database version.
+
+        Hits are read-only unless the entry's last_used is older than
+        TOUCH_INTERVAL, and that update is best-effort: it does not wait
+        for the cache's write lock, and is skipped if another query holds it.
+
+        Args:
+            db_path: Path to the movie database the output was computed from
+            key: Cache key from make_key
+            version: Current (epoch, counter) of the database
+
+        Returns:
+            Cached output or None on a miss
+        """
+        row = self.conn.execute(
+            "SELECT output, last_used FROM entries WHERE db_path = ? AND key = ? AND epoch = ? AND counter = ?",
+            (db_path, key, version[0], version[1])
+        ).fetchone()
+        if row is None:
+            return None
+
+        output, last_used = row
+        now = time.time()
+        if now - last_used >= TOUCH_INTERVAL:
+            self.conn.execute("PRAGMA busy_timeout = 0")
+            try:
+                self.conn.execute(
+                    "UPDATE entries SET last_used = ? WHERE db_path = ? AND key = ?",
+                    (now, db_path, key)
+                )
+                self.conn.commit()
+            except sqlite3.OperationalError:
+                self.conn.rollback()
+            finally:
+                self.conn.execute(f"PRAGMA busy_timeout = {CACHE_TIMEOUT * 1000}")
+        return output
+
+    def put(self, db_path: str, key: str, version: Tuple[str, int], output: str) -> None:
+        """
+        Store output and evict least recently used entries beyond the size cap.
+
+        Best-effort: if the cache stays locked by concurrent queries, the
+        output is not stored.
+
+        Args:
+            db_path: Path to the movie database the output was computed from
+            key: Cache key from make_key
+            version: (epoch, counter) of the database when the output was computed
+            output: Rendered query output
+        """
+        size = len(output.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        try:
+            self._store(db_path, key, version, output, size)
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+
+    def _store(self, db_path: str, key: str, version: Tuple[str, int], output: str, size: int) -> None:
+        """Store output and evict entries in one transaction (see put)."""
+        cursor = self.conn.cursor()
+        # Entries from older versions of this database can never be served again
+        cursor.execute(
+            "DELETE FROM entries WHERE db_path = ? AND NOT (epoch = ? AND counter = ?)",
+            (db_path, version[0], version[1])
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO entries (db_path, key, epoch, counter, output, size, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (db_path, key, version[0], version[1], output, size, time.time())
+        )
+
+        total = cursor.execute("SELECT SUM(size) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            victims = cursor.execute(
+                "SELECT db_path, key, size FROM entries ORDER BY last_used ASC"
+            ).fetchall()
+            for victim_db, victim_key, victim_size in victims:
+                if total <= self.max_bytes:
+                    break
+                cursor.execute("DELETE FROM entries WHERE db_path = ? AND key = ?", (victim_db, victim_key))
+                total -= victim_size
+
+        self.conn.commit()
+
+    def close(self) -> None:
+        """Close the cache database."""
+        self.conn.close()
@@ -0,0 +1,531 @@
+# Incremental schema upgrades for MovieClubSched
+# Brings an existing database up to date, tracked with PRAGMA user_version
+
+import logging
+import os
+import secrets
+import sqlite3
+import sys
+from datetime import datetime
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DATABASE_PATH = "data/movie_club.db"
+
+# Tables whose changes must invalidate cached query results
+TRACKED_TABLES = ("movies", "directors", "moviedirector", "host", "session")
+
+
+# Tables of the normalized schema created by migrate_db.py, before any upgrade step
+BASE_TABLES = {
+    "directors": """
+        CREATE TABLE directors (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fname TEXT NOT NULL,
+            mname TEXT,
+            lname TEXT NOT NULL
+        )
+    """,
+    "host": """
+        CREATE TABLE host (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fname TEXT NOT NULL,
+            lname TEXT NOT NULL
+        )
+    """,
+    "movies": """
+        CREATE TABLE movies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            year INTEGER,
+            country TEXT,
+            url TEXT
+        )
+    """,
+    "moviedirector": """
+        CREATE TABLE moviedirector (
+            movie_id INTEGER NOT NULL,
+            director_id INTEGER NOT NULL,
+            director_ord INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, director_id),
+            FOREIGN KEY (movie_id) REFERENCES movies(id),
+            FOREIGN KEY (director_id) REFERENCES directors(id)
+        )
+    """,
+    "session": """
+        CREATE TABLE session (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            movie_id INTEGER NOT NULL,
+            host_id INTEGER,
+            attendance INTEGER,
+            FOREIGN KEY (movie_id) REFERENCES movies(id),
+            FOREIGN KEY (host_id) REFERENCES host(id)
+        )
+    """,
+}
+
+
+def open_database(db_path: str, create: bool = False) -> sqlite3.Connection:
+    """
+    Open a movie database.
+
+    sqlite3.connect creates a missing file, which would leave an empty
+    database behind for a mistyped or not yet initialized club path.
+
+    Args:
+        db_path: Path to the database
+        create: Create the database if it does not exist
+
+    Returns:
+        Database connection
+
+    Raises:
+        sqlite3.OperationalError: If the database does not exist and create is False
+    """
+    if not create and not os.path.exists(db_path):
+        raise sqlite3.OperationalError(f"Database {db_path} does not exist")
+    return sqlite3.connect(db_path)
+
+
+def create_base_tables(cursor) -> None:
+    """
+    Create the base tables missing from the database, so a new database can be upgraded.
+
+    Args:
+        cursor: Database cursor
+    """
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+    for table, sql in BASE_TABLES.items():
+        if table not in existing:
+            logger.info(f"Creating table {table}")
+            cursor.execute(sql)
+
+
+def add_change_counter(cursor) -> None:
+    """
+    Add a change counter bumped by triggers on every write to the tracked tables.
+
+    PRAGMA data_version only reports changes made by other connections while
+    a connection stays open, so it cannot be compared across processes. The
+    counter is persisted instead. The epoch changes whenever the database is
+    recreated, so two different files never share a (epoch, counter) pair.
+
+    Args:
+        cursor: Database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            epoch TEXT NOT NULL,
+            counter INTEGER NOT NULL
+        )
+    """)
+    cursor.execute(
+        "INSERT OR IGNORE INTO change_counter (id, epoch, counter) VALUES (1, ?, 0)",
+        (secrets.token_hex(8),)
+    )
+
+    for table in TRACKED_TABLES:
+        add_counter_triggers(cursor, table)
+
+
+def add_counter_triggers(cursor, table: str) -> None:
+    """
+    Create the triggers bumping the change counter on writes to a table.
+
+    Updates that leave every column as it was, like the no-op DO UPDATE of
+    an upsert finding an existing row, do not bump the counter.
+
+    Args:
+        cursor: Database cursor
+        table: Table name
+    """
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+    changed = " OR ".join(f'OLD."{col}" IS NOT NEW."{col}"' for col in columns)
+    conditions = {"INSERT": "", "UPDATE": f"WHEN {changed}", "DELETE": ""}
+
+    for event, condition in conditions.items():
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_counter
+            AFTER {event} ON {table}
+            {condition}
+            BEGIN
+                UPDATE change_counter SET counter = counter + 1 WHERE id = 1;
+            END
+        """)
+
+
+def check_session_dates(cursor) -> None:
+    """
+    Rebuild the session table so dates are CHECKed ISO dates with a covering index.
+
+    SQLite cannot add a CHECK constraint to an existing column, so the table is
+    copied. Round-tripping through julianday() also rejects days like Feb 30.
+    ISO dates sort like the dates they represent, so range filters on the
+    index (date, movie_id, host_id, attendance) become index range scans that
+    never touch the table. Stored dates are rewritten as zero-padded
+    YYYY-MM-DD; fails, naming the sessions, if a stored date is not a valid date.
+
+    Args:
+        cursor: Database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE session_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL CHECK (date IS date(julianday(date))),
+            movie_id INTEGER NOT NULL,
+            host_id INTEGER,
+            attendance INTEGER,
+            FOREIGN KEY (movie_id) REFERENCES movies(id),
+            FOREIGN KEY (host_id) REFERENCES host(id)
+        )
+    """)
+
+    # ingest.py used to accept dates that are not zero-padded (e.g. 2026-3-3)
+    # and store them as given, so each date is canonicalized the same way
+    rows = []
+    invalid = []
+    for session_id, session_date, movie_id, host_id, attendance in cursor.execute(
+        "SELECT id, date, movie_id, host_id, attendance FROM session"
+    ).fetchall():
+        try:
+            session_date = datetime.strptime(session_date.strip(), "%Y-%m-%d").date().isoformat()
+        except (AttributeError, ValueError):
+            invalid.append(f"{session_id} ({session_date!r})")
+            continue
+        rows.append((session_id, session_date, movie_id, host_id, attendance))
+
+    if invalid:
+        raise ValueError(f"Sessions with invalid dates, fix them before upgrading: {', '.join(invalid)}")
+
+    cursor.executemany(
+        "INSERT INTO session_new (id, date, movie_id, host_id, attendance) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    cursor.execute("DROP TABLE session")
+    cursor.execute("ALTER TABLE session_new RENAME TO session")
+    cursor.execute("CREATE INDEX session_date_movie_host ON session (date, movie_id, host_id, attendance)")
+
+    # Dropping the old table dropped its triggers
+    add_counter_triggers(cursor, "session")
+
+
+# Director display names of the movie in the current movies row, in credit order
+CREDITS_SQL = """
+    (SELECT GROUP_CONCAT(name, '; ') FROM (
+        SELECT d.fname
+               || CASE WHEN IFNULL(d.mname, '') = '' THEN '' ELSE ' ' || d.mname END
+               || CASE WHEN IFNULL(d.lname, '') = '' THEN '' ELSE ' ' || d.lname END AS name
+        FROM moviedirector md
+        JOIN directors d ON md.director_id = d.id
+        WHERE md.movie_id = movies.id
+        ORDER BY md.director_ord
+    ))
+"""
+
+
+def add_movie_credits(cursor) -> None:
+    """
+    Add a precomputed movies.credits column kept correct by triggers.
+
+    Queries read the director names from this column instead of joining
+    through moviedirector and grouping on every call.
+
+    Args:
+        cursor: Database cursor
+    """
+    cursor.execute("ALTER TABLE movies ADD COLUMN credits TEXT")
+    cursor.execute(f"UPDATE movies SET credits = {CREDITS_SQL}")
+
+    cursor.execute(f"""
+        CREATE TRIGGER moviedirector_insert_credits
+        AFTER INSERT ON moviedirector
+        BEGIN
+            UPDATE movies SET credits = {CREDITS_SQL} WHERE id = NEW.movie_id;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER moviedirector_update_credits
+        AFTER UPDATE ON moviedirector
+        BEGIN
+            UPDATE movies SET credits = {CREDITS_SQL} WHERE id IN (OLD.movie_id, NEW.movie_id);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER moviedirector_delete_credits
+        AFTER DELETE ON moviedirector
+        BEGIN
+            UPDATE movies SET credits = {CREDITS_SQL} WHERE id = OLD.movie_id;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER directors_update_credits
+        AFTER UPDATE OF fname, mname, lname ON directors
+        BEGIN
+            UPDATE movies SET credits = {CREDITS_SQL}
+            WHERE id IN (SELECT movie_id FROM moviedirector WHERE director_id = NEW.id);
+        END
+    """)
+
+
+# Weight of a shared feature of each kind when ranking similar movies
+FEATURE_WEIGHTS = {
+    "director": 3.0,
+    "country": 1.0,
+    "decade": 1.0,
+    "audience": 0.5,
+}
+
+
+def features_sql(movie_id: str) -> str:
+    """
+    Build the SELECT producing the (movie_id, feature, weight) rows of one movie.
+
+    Audience buckets the average recorded attendance, so movies that drew
+    similar crowds share a feature.
+
+    Args:
+        movie_id: SQL expression for the movie ID, e.g. NEW.movie_id
+
+    Returns:
+        SQL SELECT statement
+    """
+    return f"""
+        SELECT id, 'country:' || country, {FEATURE_WEIGHTS["country"]}
+        FROM movies WHERE id = {movie_id} AND country IS NOT NULL
+        UNION ALL
+        SELECT id, 'decade:' || (year / 10 * 10), {FEATURE_WEIGHTS["decade"]}
+        FROM movies WHERE id = {movie_id} AND year IS NOT NULL
+        UNION ALL
+        SELECT movie_id, 'director:' || director_id, {FEATURE_WEIGHTS["director"]}
+        FROM moviedirector WHERE movie_id = {movie_id}
+        UNION ALL
+        {audience_sql(movie_id)}
+    """
+
+
+def audience_sql(movie_id: str) -> str:
+    """Build the SELECT producing the audience feature row of one movie, if it has recorded attendance."""
+    return f"""
+        SELECT movie_id, 'audience:' || CASE
+                   WHEN AVG(attendance) < 5 THEN 'small'
+                   WHEN AVG(attendance) < 15 THEN 'medium'
+                   WHEN AVG(attendance) < 30 THEN 'large'
+                   ELSE 'packed'
+               END, {FEATURE_WEIGHTS["audience"]}
+        FROM session WHERE movie_id = {movie_id} AND attendance IS NOT NULL
+        GROUP BY movie_id
+    """
+
+
+def refresh_features_sql(movie_id: str) -> str:
+    """Build the statements recomputing the features of one movie inside a trigger."""
+    return f"""
+        DELETE FROM moviefeature WHERE movie_id = {movie_id};
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) {features_sql(movie_id)};
+    """
+
+
+def refresh_audience_sql(movie_id: str) -> str:
+    """Build the statements recomputing only the audience feature of one movie inside a trigger."""
+    # A range on the primary key rather than LIKE, which cannot use the index
+    return f"""
+        DELETE FROM moviefeature
+        WHERE movie_id = {movie_id} AND feature >= 'audience:' AND feature < 'audience;';
+        INSERT OR IGNORE INTO moviefeature (movie_id, feature, weight) {audience_sql(movie_id)};
+    """
+
+
+def add_movie_features(cursor) -> None:
+    """
+    Add the sparse feature index used to find similar movies.
+
+    Each movie has one row per feature (director, country, decade, audience),
+    indexed by feature so movies sharing features with a given one are found
+    with index lookups. Triggers recompute the features of a movie whenever
+    it, its directors or its sessions change, so ingest.py keeps the index
+    current without any pairwise recomputation.
+
+    Args:
+        cursor: Database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE moviefeature (
+            movie_id INTEGER NOT NULL,
+            feature TEXT NOT NULL,
+            weight REAL NOT NULL,
+            PRIMARY KEY (movie_id, feature),
+            FOREIGN KEY (movie_id) REFERENCES movies(id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX moviefeature_feature ON moviefeature (feature, movie_id)")
+
+    movie_ids = [row[0] for row in cursor.execute("SELECT id FROM movies").fetchall()]
+    for movie_id in movie_ids:
+        cursor.execute(f"INSERT INTO moviefeature (movie_id, feature, weight) {features_sql(movie_id)}")
+
+    triggers = [
+        ("movies_insert_features", "AFTER INSERT ON movies", refresh_features_sql("NEW.id")),
+        ("movies_update_features", "AFTER UPDATE OF year, country ON movies", refresh_features_sql("NEW.id")),
+        ("movies_delete_features", "AFTER DELETE ON movies", "DELETE FROM moviefeature WHERE movie_id = OLD.id;"),
+        ("moviedirector_insert_features", "AFTER INSERT ON moviedirector", refresh_features_sql("NEW.movie_id")),
+        ("moviedirector_update_features", "AFTER UPDATE ON moviedirector",
+         refresh_features_sql("OLD.movie_id") + refresh_features_sql("NEW.movie_id")),
+        ("moviedirector_delete_features", "AFTER DELETE ON moviedirector", refresh_features_sql("OLD.movie_id")),
+        ("session_insert_features", "AFTER INSERT ON session", refresh_features_sql("NEW.movie_id")),
+        ("session_update_features", "AFTER UPDATE OF movie_id, attendance ON session",
+         refresh_features_sql("OLD.movie_id") + refresh_features_sql("NEW.movie_id")),
+        ("session_delete_features", "AFTER DELETE ON session", refresh_features_sql("OLD.movie_id")),
+    ]
+    for name, event, body in triggers:
+        cursor.execute(f"CREATE TRIGGER {name} {event} BEGIN {body} END")
+
+
+def add_natural_keys(cursor) -> None:
+    """
+    Add unique indexes on the natural keys used by ingest.py upserts.
+
+    A movie is identified by its title and year, and a session by its date
+    and movie. Fails, naming the rows, if the database already holds
+    duplicates of either (including sessions whose dates only became equal
+    once check_session_dates canonicalized them).
+
+    Args:
+        cursor: Database cursor
+    """
+    duplicates = []
+    for table, key in (("movies", "title, year"), ("session", "date, movie_id")):
+        for ids, in cursor.execute(f"""
+            SELECT GROUP_CONCAT(id, ', ') FROM (SELECT id, {key} FROM {table} ORDER BY id)
+            GROUP BY {key} HAVING COUNT(*) > 1
+        """).fetchall():
+            duplicates.append(f"{table} {ids}")
+
+    if duplicates:
+        raise ValueError(f"Duplicate rows, merge them before upgrading: {'; '.join(duplicates)}")
+
+    cursor.execute("CREATE UNIQUE INDEX movies_title_year ON movies (title, year)")
+    cursor.execute("CREATE UNIQUE INDEX session_date_movie ON session (date, movie_id)")
+
+
+def index_session_attendance(cursor) -> None:
+    """
+    Index session attendance by movie and narrow the session feature triggers.
+
+    The audience feature averages the attendance of a movie's sessions. Without
+    an index on movie_id that average scanned the whole session table on every
+    session write. Session writes now only recompute the audience feature,
+    and only when they can change it.
+
+    Args:
+        cursor: Database cursor
+    """
+    cursor.execute("CREATE INDEX session_movie_attendance ON session (movie_id, attendance)")
+
+    for event in ("insert", "update", "delete"):
+        cursor.execute(f"DROP TRIGGER session_{event}_features")
+
+    triggers = [
+        ("session_insert_features", "AFTER INSERT ON session",
+         "NEW.attendance IS NOT NULL", refresh_audience_sql("NEW.movie_id")),
+        ("session_update_features", "AFTER UPDATE OF movie_id, attendance ON session",
+         "OLD.movie_id IS NOT NEW.movie_id OR OLD.attendance IS NOT NEW.attendance",
+         refresh_audience_sql("OLD.movie_id") + refresh_audience_sql("NEW.movie_id")),
+        ("session_delete_features", "AFTER DELETE ON session",
+         "OLD.attendance IS NOT NULL", refresh_audience_sql("OLD.movie_id")),
+    ]
+    for name, event, condition, body in triggers:
+        cursor.execute(f"CREATE TRIGGER {name} {event} WHEN {condition} BEGIN {body} END")
+
+
+def skip_noop_counter_updates(cursor) -> None:
+    """
+    Recreate the update counter triggers so no-op updates leave the counter alone.
+
+    ingest.py upserts movies and sessions, and the DO UPDATE branch rewrites
+    an existing row with the same values. That used to bump the counter and
+    invalidate every cached query result, even when re-ingesting a file
+    that was already loaded.
+
+    Args:
+        cursor: Database cursor
+    """
+    for table in TRACKED_TABLES:
+        cursor.execute(f"DROP TRIGGER {table}_update_counter")
+        add_counter_triggers(cursor, table)
+
+
+# Upgrade steps in order; the database's user_version is the number applied
+# data/movie_club_schema.sql is the schema after every step: update it, and its
+# PRAGMA user_version, when adding one
+UPGRADES = [
+    add_change_counter,
+    check_session_dates,
+    add_movie_credits,
+    add_movie_features,
+    add_natural_keys,
+    index_session_attendance,
+    skip_noop_counter_updates,
+]
+
+SCHEMA_VERSION = len(UPGRADES)
+
+
+def upgrade_schema(conn) -> None:
+    """
+    Apply any pending upgrade steps to the database.
+
+    Cheap when the database is already current: a single PRAGMA read. A new,
+    empty database gets the base tables first.
+
+    Args:
+        conn: Database connection
+
+    Raises:
+        sqlite3.DatabaseError: If an upgrade step fails; nothing is applied
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    step = None
+    try:
+        if version == 0:
+            create_base_tables(cursor)
+        for step_num in range(version, SCHEMA_VERSION):
+            step = UPGRADES[step_num]
+            logger.info(f"Applying schema upgrade {step_num + 1}: {step.__name__}")
+            step(cursor)
+            cursor.execute(f"PRAGMA user_version = {step_num + 1}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        # One exception type for callers, which all report database errors already
+        name = step.__name__ if step else "create_base_tables"
+        raise sqlite3.DatabaseError(f"Schema upgrade {name} failed: {e}") from e
+
+
+def main():
+    """Entry point for the script."""
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DATABASE_PATH
+    try:
+        conn = open_database(db_path)
+        try:
+            upgrade_schema(conn)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.error(str(e))
+        sys.exit(1)
+    logger.info(f"Database {db_path} is at schema version {SCHEMA_VERSION}")
+
+
+if __name__ == "__main__":
+    main()